@@ -0,0 +1,226 @@
+# benchmark.py
+# ------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+benchmark.py times the parts of the game engine that search agents lean on.
+It is not part of the assignment; run it before and after changing pacman.py
+or game.py to see what the change did.
+
+> python benchmark.py successors -l mediumClassic
+> python benchmark.py grids -l originalClassic
+> python benchmark.py simulator -l mediumClassic
+> python benchmark.py headless -n 1000
+"""
+
+import random, sys, time
+import layout
+from game import Grid, reconstituteGrid
+from pacman import GameState, ClassicGameRules
+from simulator import PacmanSimulator
+
+def benchmarkSuccessors(layoutName='mediumClassic', seconds=3.0, seed=0):
+    """
+    Walks randomly through games on the layout, generating every successor of
+    every state on the way like a one-ply search would, and returns the
+    number of successors generated per second.
+    """
+    rng = random.Random(seed)
+    lay = layout.getLayout(layoutName)
+    if lay == None: raise Exception("The layout " + layoutName + " cannot be found")
+    start = GameState()
+    start.initialize(lay, lay.getNumGhosts())
+
+    state, agentIndex = start, 0
+    generated = 0
+    startTime = time.perf_counter()
+    while time.perf_counter() - startTime < seconds:
+        if state.isWin() or state.isLose():
+            state, agentIndex = start, 0
+        successors = [state.generateSuccessor(agentIndex, action) for action in state.getLegalActions(agentIndex)]
+        generated += len(successors)
+        state = rng.choice(successors)
+        agentIndex = (agentIndex + 1) % state.getNumAgents()
+    return generated / (time.perf_counter() - startTime)
+
+def loopPackBits(grid):
+    """
+    Grid.packBits as it was first written, one cell at a time: the reference
+    the grid benchmark compares against.
+    """
+    bits = [grid.width, grid.height]
+    currentInt = 0
+    for i in range(grid.height * grid.width):
+        bit = grid.CELLS_PER_INT - (i % grid.CELLS_PER_INT) - 1
+        x, y = i // grid.height, i % grid.height
+        if grid[x][y]:
+            currentInt += 2 ** bit
+        if (i + 1) % grid.CELLS_PER_INT == 0:
+            bits.append(currentInt)
+            currentInt = 0
+    bits.append(currentInt)
+    return tuple(bits)
+
+def loopUnpackBits(bitRep):
+    """
+    reconstituteGrid as it was first written, one bit at a time.
+    """
+    width, height = bitRep[:2]
+    grid = Grid(width, height)
+    cell = 0
+    for packed in bitRep[2:]:
+        for i in range(grid.CELLS_PER_INT):
+            n = 2 ** (grid.CELLS_PER_INT - i - 1)
+            bit = packed >= n
+            if bit: packed -= n
+            if cell == width * height: break
+            grid[cell // height][cell % height] = bit
+            cell += 1
+    return grid
+
+# How a Grid can be packed and unpacked again, the reference loop first
+GRID_PACKINGS = [
+    ('loop', loopPackBits, loopUnpackBits),
+    ('packBits', Grid.packBits, reconstituteGrid),
+    ('bytes', Grid.toBytes, Grid.fromBytes),
+]
+
+def benchmarkGrids(layoutName='mediumClassic', seconds=3.0, seed=0):
+    """
+    Packs the layout's walls and unpacks them again with each of
+    GRID_PACKINGS in turn, for a third of the time each, and returns the
+    number of round trips per second of each as a dict.  packBits is what
+    pickles of old GameStates hold; toBytes is what pickling a Grid uses.
+    """
+    lay = layout.getLayout(layoutName)
+    if lay == None: raise Exception("The layout " + layoutName + " cannot be found")
+    walls = lay.walls
+
+    rates = {}
+    for name, pack, unpack in GRID_PACKINGS:
+        trips = 0
+        startTime = time.perf_counter()
+        while time.perf_counter() - startTime < seconds / len(GRID_PACKINGS):
+            unpack(pack(walls))
+            trips += 1
+        rates[name] = trips / (time.perf_counter() - startTime)
+    return rates
+
+def benchmarkPlayouts(layoutName='mediumClassic', seconds=3.0, seed=0):
+    """
+    Plays uniformly random games on the layout with GameState and returns the
+    number of plies played per second.
+    """
+    rng = random.Random(seed)
+    lay = layout.getLayout(layoutName)
+    if lay == None: raise Exception("The layout " + layoutName + " cannot be found")
+    start = GameState()
+    start.initialize(lay, lay.getNumGhosts())
+
+    plies = 0
+    startTime = time.perf_counter()
+    while time.perf_counter() - startTime < seconds:
+        state, agentIndex = start, 0
+        while not (state.isWin() or state.isLose()):
+            state = state.generateSuccessor(agentIndex, rng.choice(state.getLegalActions(agentIndex)))
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+            plies += 1
+    return plies / (time.perf_counter() - startTime)
+
+def benchmarkSimulator(layoutName='mediumClassic', seconds=3.0, seed=0):
+    """
+    The playouts benchmark, played with PacmanSimulator instead of GameState.
+    """
+    rng = random.Random(seed)
+    lay = layout.getLayout(layoutName)
+    if lay == None: raise Exception("The layout " + layoutName + " cannot be found")
+
+    plies = 0
+    startTime = time.perf_counter()
+    while time.perf_counter() - startTime < seconds:
+        plies += PacmanSimulator(lay).playout(rng, sys.maxsize)
+    return plies / (time.perf_counter() - startTime)
+
+def benchmarkGames(layoutName='mediumClassic', seconds=3.0, seed=0, numGames=None, headless=False):
+    """
+    Plays games of LeftTurnAgent against RandomGhosts without graphics, for
+    the given number of seconds or of games, and returns the number of moves
+    made per second.
+    """
+    import pacmanAgents, ghostAgents, textDisplay
+    random.seed(seed)
+    lay = layout.getLayout(layoutName)
+    if lay == None: raise Exception("The layout " + layoutName + " cannot be found")
+    rules = ClassicGameRules()
+
+    moves, played = 0, 0
+    startTime = time.perf_counter()
+    while played < numGames if numGames else time.perf_counter() - startTime < seconds:
+        ghosts = [ghostAgents.RandomGhost(i + 1) for i in range(lay.getNumGhosts())]
+        game = rules.newGame(lay, pacmanAgents.LeftTurnAgent(), ghosts, textDisplay.NullGraphics(), True, False, headless)
+        game.run()
+        moves += len(game.moveHistory)
+        played += 1
+    return moves / (time.perf_counter() - startTime)
+
+def benchmarkHeadlessGames(layoutName='mediumClassic', seconds=3.0, seed=0, numGames=None):
+    """
+    The games benchmark, played with Game.runHeadless.
+    """
+    return benchmarkGames(layoutName, seconds, seed, numGames, headless=True)
+
+GAME_BENCHMARKS = ['games', 'headless']
+
+BENCHMARKS = {
+    'successors': (benchmarkSuccessors, 'successors/second'),
+    'grids': (benchmarkGrids, 'round trips/second'),
+    'playouts': (benchmarkPlayouts, 'plies/second'),
+    'simulator': (benchmarkSimulator, 'plies/second'),
+    'games': (benchmarkGames, 'moves/second'),
+    'headless': (benchmarkHeadlessGames, 'moves/second'),
+}
+
+def readCommand(argv):
+    from optparse import OptionParser
+    usageStr = """
+    USAGE:      python benchmark.py <benchmark> <options>
+    BENCHMARKS: %s
+    """ % ', '.join(sorted(BENCHMARKS))
+    parser = OptionParser(usageStr)
+    parser.add_option('-l', '--layout', dest='layout', default='mediumClassic',
+                      help='the layout to benchmark on [Default: %default]')
+    parser.add_option('-s', '--seconds', dest='seconds', type='float', default=3.0,
+                      help='how long to run the benchmark for [Default: %default]')
+    parser.add_option('-n', '--numGames', dest='numGames', type='int', default=None,
+                      help='for ' + ' and '.join(GAME_BENCHMARKS) + ', play this many games instead of running for a time')
+    options, args = parser.parse_args(argv)
+    if len(args) != 1 or args[0] not in BENCHMARKS:
+        parser.error('choose one benchmark from: ' + ', '.join(sorted(BENCHMARKS)))
+    if options.numGames and args[0] not in GAME_BENCHMARKS:
+        parser.error('-n only applies to ' + ' and '.join(GAME_BENCHMARKS))
+    return args[0], options
+
+if __name__ == '__main__':
+    name, options = readCommand(sys.argv[1:])
+    function, unit = BENCHMARKS[name]
+    if options.numGames:
+        rate = function(options.layout, options.seconds, numGames=options.numGames)
+    else:
+        rate = function(options.layout, options.seconds)
+    if name == 'grids':
+        reference = rate[GRID_PACKINGS[0][0]]
+        for method, pack, unpack in GRID_PACKINGS:
+            print('%s on %s with %s: %.0f %s (%.1fx the loop)' % (
+                name, options.layout, method, rate[method], unit, rate[method] / reference))
+    else:
+        print('%s on %s: %.0f %s' % (name, options.layout, rate, unit))
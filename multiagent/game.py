@@ -22,6 +22,7 @@
 
 from util import *
 import time, os
+import itertools
 import traceback
 import sys
 
@@ -173,7 +174,8 @@ class Grid:
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(height)] for x in range(width)]
+        self.data = [[initialValue] * height for x in range(width)]
+        self.legalMoves = None # The LegalMoves of a layout's walls
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
@@ -216,6 +218,9 @@ class Grid:
         g.data = self.data
         return g
 
+    def toBitGrid(self):
+        return BitGrid.fromGrid(self)
+
     def count(self, item =True ):
         return sum([x.count(item) for x in self.data])
 
@@ -232,21 +237,53 @@ class Grid:
 
         (width, height, bitPackedInts...)
         """
-        bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
-        return tuple(bits)
+        return _packCells(self.width, self.height, self._cellString())
+
+    def toBytes(self):
+        """
+        Returns a compact bytes representation: the width and height as two
+        big-endian shorts, then one bit per cell (cell index x * height + y)
+        in little-endian order.
+        """
+        return _packBytes(self.width, self.height, int(self._cellString()[::-1] or '0', 2))
+
+    def fromBytes(data):
+        "Builds a Grid from the output of toBytes"
+        width, height, bits = _unpackBytes(data)
+        g = Grid(width, height)
+        g._setBits(bits)
+        return g
+    fromBytes = staticmethod(fromBytes)
+
+    def __getstate__(self):
+        # Boolean grids (walls, food) are pickled as packed bytes
+        for column in self.data:
+            for cell in column:
+                if type(cell) is not bool: return self.__dict__
+        return {'packed': self.toBytes(), 'CELLS_PER_INT': self.CELLS_PER_INT}
+
+    def __setstate__(self, state):
+        if 'packed' in state:
+            g = Grid.fromBytes(state['packed'])
+            state = dict(g.__dict__, CELLS_PER_INT=state['CELLS_PER_INT'])
+        self.__dict__.update(state)
+
+    def _cellString(self):
+        "The cells in cell index order as a string of '0's and '1's"
+        try:
+            return b''.join([bytes(column) for column in self.data]).translate(_BYTE_TO_DIGIT).decode('ascii')
+        except (TypeError, ValueError):
+            return ''.join(['1' if cell else '0' for column in self.data for cell in column])
+
+    def _setBits(self, bits):
+        "Fills in data from an int holding cell index i at bit i"
+        height = self.height
+        raw = bits.to_bytes((self.width * height + 7) // 8, 'little')
+        cells = list(itertools.chain.from_iterable(map(_BYTE_TO_CELLS.__getitem__, raw)))
+        self.data = [cells[x * height:(x + 1) * height] for x in range(self.width)]
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -254,27 +291,202 @@ class Grid:
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
-        for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height: break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
+        cells = ''.join([''.join(['1' if b else '0' for b in self._unpackInt(packed, self.CELLS_PER_INT)]) for packed in bits])
+        self._setBits(int(cells[:self.width * self.height][::-1] or '0', 2))
 
     def _unpackInt(self, packed, size):
-        bools = []
         if packed < 0: raise ValueError("must be a positive integer")
-        for i in range(size):
-            n = 2 ** (self.CELLS_PER_INT - i - 1)
-            if packed >= n:
-                bools.append(True)
-                packed -= n
-            else:
-                bools.append(False)
-        return bools
+        return [c == '1' for c in format(packed, '0%db' % self.CELLS_PER_INT)[:size]]
+
+# Translates cell bytes (0 or 1) to the digits '0' and '1'
+_BYTE_TO_DIGIT = bytes([48] + [49] * 255)
+# The eight cells, least significant bit first, stored in each possible byte
+_BYTE_TO_CELLS = [tuple([(byte >> bit) & 1 == 1 for bit in range(8)]) for byte in range(256)]
+
+def _packCells(width, height, cells, cellsPerInt=30):
+    """
+    Packs a string of cells in cell index order into the (width, height,
+    ints...) format of Grid.packBits, cellsPerInt cells to an int with the
+    first cell in the most significant bit.  A trailing int is always added
+    for the last partial (possibly empty) chunk.
+    """
+    ints = [int(cells[i:i + cellsPerInt].ljust(cellsPerInt, '0'), 2) for i in range(0, len(cells), cellsPerInt)]
+    if len(cells) % cellsPerInt == 0: ints.append(0)
+    return tuple([width, height] + ints)
+
+def _packBytes(width, height, bits):
+    return width.to_bytes(2, 'big') + height.to_bytes(2, 'big') + bits.to_bytes((width * height + 7) // 8, 'little')
+
+def _unpackBytes(data):
+    width = int.from_bytes(data[0:2], 'big')
+    height = int.from_bytes(data[2:4], 'big')
+    if len(data) != 4 + (width * height + 7) // 8:
+        raise ValueError('packed grid has the wrong length for a %dx%d grid' % (width, height))
+    return width, height, int.from_bytes(data[4:], 'little')
+
+class BitGrid:
+    """
+    A boolean Grid packed into the bits of a single Python int, with the cell
+    (x,y) stored at bit x * height + y.  It supports the same grid[x][y]
+    access as Grid, but copying shares the (immutable) int, count is a
+    popcount, asList only visits the set bits and hashing hashes one int.
+    The hash is the same as that of a Grid with the same contents.
+    """
+    def __init__(self, width, height, initialValue=False, bitRepresentation=None):
+        if initialValue not in [False, True]: raise Exception('Grids can only contain booleans')
+        self.width = width
+        self.height = height
+        self.bits = (1 << (width * height)) - 1 if initialValue else 0
+        if bitRepresentation:
+            cells = ''.join([format(packed, '030b') for packed in bitRepresentation])
+            self.bits = int(cells[:width * height][::-1] or '0', 2)
+
+    def fromGrid(grid):
+        "Builds a BitGrid with the contents of a Grid"
+        g = BitGrid(grid.width, grid.height)
+        g.bits = int(grid._cellString()[::-1] or '0', 2)
+        return g
+    fromGrid = staticmethod(fromGrid)
+
+    def toGrid(self):
+        g = Grid(self.width, self.height)
+        g.data = self.data
+        return g
+
+    def _index(self, x, y):
+        if x < 0: x += self.width
+        if y < 0: y += self.height
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            raise IndexError('grid index out of range')
+        return x * self.height + y
+
+    def __getitem__(self, i):
+        if i < 0: i += self.width
+        if not 0 <= i < self.width: raise IndexError('grid index out of range')
+        return _BitGridColumn(self, i)
+
+    def __setitem__(self, key, item):
+        column = self[key]
+        for y, value in enumerate(item):
+            column[y] = value
+
+    def get(self, x, y):
+        return (self.bits >> self._index(x, y)) & 1 == 1
+
+    def set(self, x, y, value):
+        bit = 1 << self._index(x, y)
+        if value:
+            self.bits |= bit
+        else:
+            self.bits &= ~bit
+
+    def getData(self):
+        "The contents as a list of columns, like Grid.data"
+        bits, height = self.bits, self.height
+        return [[(bits >> (x * height + y)) & 1 == 1 for y in range(height)] for x in range(self.width)]
+    data = property(getData)
+
+    def __str__(self):
+        out = [[str(self.get(x, y))[0] for x in range(self.width)] for y in range(self.height)]
+        out.reverse()
+        return '\n'.join([''.join(x) for x in out])
+
+    def __eq__(self, other):
+        if other == None: return False
+        if isinstance(other, BitGrid):
+            return self.bits == other.bits and self.width == other.width and self.height == other.height
+        return self.data == other.data
+
+    def __hash__(self):
+        return hash(self.bits)
+
+    def copy(self):
+        g = BitGrid(self.width, self.height)
+        g.bits = self.bits
+        return g
+
+    def deepCopy(self):
+        return self.copy()
+
+    def shallowCopy(self):
+        return self.copy()
+
+    def count(self, item =True ):
+        n = _popcount(self.bits)
+        if item: return n
+        return self.width * self.height - n
+
+    def asList(self, key = True):
+        bits = self.bits
+        if not key: bits ^= (1 << (self.width * self.height)) - 1
+        list = []
+        height = self.height
+        while bits:
+            low = bits & -bits
+            index = low.bit_length() - 1
+            list.append( (index // height, index % height) )
+            bits ^= low
+        return list
+
+    def packBits(self):
+        "Returns the same (width, height, bitPackedInts...) tuple as Grid.packBits"
+        n = self.width * self.height
+        cells = format(self.bits, '0%db' % n)[::-1] if n else ''
+        return _packCells(self.width, self.height, cells)
+
+    def toBytes(self):
+        "Returns the same bytes representation as Grid.toBytes"
+        return _packBytes(self.width, self.height, self.bits)
+
+    def fromBytes(data):
+        "Builds a BitGrid from the output of toBytes"
+        width, height, bits = _unpackBytes(data)
+        g = BitGrid(width, height)
+        g.bits = bits
+        return g
+    fromBytes = staticmethod(fromBytes)
+
+class _BitGridColumn:
+    "The column grid[x] of a BitGrid, so that grid[x][y] works as for a Grid"
+    __slots__ = ('grid', 'x')
+
+    def __init__(self, grid, x):
+        self.grid = grid
+        self.x = x
+
+    def __getitem__(self, y):
+        grid = self.grid
+        if y < 0: y += grid.height
+        if not 0 <= y < grid.height: raise IndexError('grid index out of range')
+        return (grid.bits >> (self.x * grid.height + y)) & 1 == 1
+
+    def __setitem__(self, y, value):
+        self.grid.set(self.x, y, value)
+
+    def __len__(self):
+        return self.grid.height
+
+    def __iter__(self):
+        for y in range(self.grid.height):
+            yield self.grid.get(self.x, y)
+
+try:
+    _popcount = int.bit_count
+except AttributeError: # Python < 3.10
+    def _popcount(n):
+        return bin(n).count('1')
 
 def reconstituteGrid(bitRep):
+    """
+    Turns the output of packBits back into a Grid, or the output of toBytes
+    into a BitGrid.  Anything else is returned unchanged.
+
+    Unlike Grid.fromBytes, bytes come back as a BitGrid rather than a Grid:
+    game states keep their food as a BitGrid, and a BitGrid compares equal
+    to a Grid with the same cells, so either can stand in for the other.
+    """
+    if isinstance(bitRep, (bytes, bytearray)):
+        return BitGrid.fromBytes(bitRep)
     if type(bitRep) is not type((1,2)):
         return bitRep
     width, height = bitRep[:2]
@@ -330,6 +542,12 @@ class Actions:
     directionToVector = staticmethod(directionToVector)
 
     def getPossibleActions(config, walls):
+        # Layout walls carry move tables; other grids (a BitGrid, or a Grid
+        # pickled before the tables existed) are scanned
+        legalMoves = getattr(walls, 'legalMoves', None)
+        if legalMoves is not None:
+            return list(legalMoves.getPossibleActions(config))
+
         possible = []
         x, y = config.pos
         x_int, y_int = int(x + 0.5), int(y + 0.5)
@@ -349,6 +567,10 @@ class Actions:
     getPossibleActions = staticmethod(getPossibleActions)
 
     def getLegalNeighbors(position, walls):
+        legalMoves = getattr(walls, 'legalMoves', None)
+        if legalMoves is not None:
+            return list(legalMoves.getLegalNeighbors(position))
+
         x,y = position
         x_int, y_int = int(x + 0.5), int(y + 0.5)
         neighbors = []
@@ -368,6 +590,223 @@ class Actions:
         return (x + dx, y + dy)
     getSuccessor = staticmethod(getSuccessor)
 
+class LegalMoves:
+    """
+    Move tables for a fixed wall grid, built once so that Actions and the
+    game rules need not look at the walls on every call.  For the cell
+    (x,y), at index x * height + y, it holds:
+
+      masks[cell]:         a bitmask of DIRECTION_BITS that don't run into a wall
+      actions[cell]:       the possible actions, in Actions.getPossibleActions order
+      neighbors[cell]:     the legal neighbours, as Actions.getLegalNeighbors gives them
+      ghostActions[cell]:  a dict from a ghost's direction to its legal actions:
+                           no STOP, and no turning around unless it has to
+      adjacent[cell]:      the indices of the cells one move away
+    """
+    FOOD_FIELDS = 256 # Food distance fields kept per maze
+    MAX_REPAIRS = 4 # Eaten food beyond which a food field is rebuilt, not repaired
+    MIN_REPAIR_FOOD = 10 # With less food left than this, rebuilding is faster
+
+    DIRECTION_BITS = {Directions.NORTH: 1,
+                      Directions.SOUTH: 2,
+                      Directions.EAST:  4,
+                      Directions.WEST:  8,
+                      Directions.STOP:  16}
+
+    def __init__(self, walls):
+        self.width, self.height = walls.width, walls.height
+        self.masks, self.actions, self.neighbors, self.ghostActions = [], [], [], []
+        self.adjacent = []
+        self.distances = {}
+        self.foodFields = {}
+        for x in range(self.width):
+            for y in range(self.height):
+                mask = 0
+                possible, neighbors = [], []
+                for dir, (dx, dy) in Actions._directionsAsList:
+                    next_x, next_y = x + dx, y + dy
+                    if not (0 <= next_x < self.width and 0 <= next_y < self.height): continue
+                    if walls[next_x][next_y]: continue
+                    mask |= LegalMoves.DIRECTION_BITS[dir]
+                    possible.append(dir)
+                    neighbors.append((next_x, next_y))
+                self.masks.append(mask)
+                self.actions.append(tuple(possible))
+                self.neighbors.append(tuple(neighbors))
+                self.adjacent.append(tuple([next_x * self.height + next_y for next_x, next_y in neighbors
+                                            if (next_x, next_y) != (x, y)]))
+
+                turns = {}
+                for dir in LegalMoves.DIRECTION_BITS:
+                    legal = [action for action in possible if action != Directions.STOP]
+                    reverse = Directions.REVERSE[dir]
+                    if reverse in legal and len(legal) > 1:
+                        legal.remove(reverse)
+                    turns[dir] = tuple(legal)
+                self.ghostActions.append(turns)
+
+    def isLegal(self, position, direction):
+        x, y = position
+        return self.masks[x * self.height + y] & LegalMoves.DIRECTION_BITS[direction] != 0
+
+    def getPossibleActions(self, config):
+        x, y = config.pos
+        x_int, y_int = int(x + 0.5), int(y + 0.5)
+
+        # In between grid points, all agents must continue straight
+        if (abs(x - x_int) + abs(y - y_int)  > Actions.TOLERANCE):
+            return (config.direction,)
+        return self.actions[x_int * self.height + y_int]
+
+    def getGhostActions(self, config):
+        x, y = config.pos
+        x_int, y_int = int(x + 0.5), int(y + 0.5)
+
+        # Scared ghosts between grid points keep going
+        if (abs(x - x_int) + abs(y - y_int)  > Actions.TOLERANCE):
+            if config.direction == Directions.STOP: return ()
+            return (config.direction,)
+        return self.ghostActions[x_int * self.height + y_int][config.direction]
+
+    def getLegalNeighbors(self, position):
+        x, y = position
+        return self.neighbors[int(x + 0.5) * self.height + int(y + 0.5)]
+
+    def getDistanceField(self, positions):
+        """
+        Returns the maze distance from the nearest of positions to every
+        cell, as a list indexed like the tables, with None for cells that
+        cannot be reached.
+        """
+        field = [None] * (self.width * self.height)
+        frontier = []
+        for x, y in positions:
+            cell = int(x + 0.5) * self.height + int(y + 0.5)
+            if field[cell] is None:
+                field[cell] = 0
+                frontier.append(cell)
+        adjacent, distance = self.adjacent, 0
+        while frontier:
+            distance += 1
+            nextFrontier = []
+            for cell in frontier:
+                for neighbor in adjacent[cell]:
+                    if field[neighbor] is None:
+                        field[neighbor] = distance
+                        nextFrontier.append(neighbor)
+            frontier = nextFrontier
+        return field
+
+    def getDistances(self, position):
+        """
+        The distance field of a single position.  These are kept, since the
+        maze does not change.
+        """
+        x, y = position
+        cell = int(x + 0.5) * self.height + int(y + 0.5)
+        if cell not in self.distances:
+            self.distances[cell] = self.getDistanceField([position])
+        return self.distances[cell]
+
+    def getFoodDistances(self, food, previous = None):
+        """
+        The distance field of all the food in a food grid.  Fields are kept
+        for the last FOOD_FIELDS food grids.  previous is the (food, field)
+        pair of an earlier state; if only a little of its food has been eaten
+        since, its field is repaired instead of searched from scratch.
+        """
+        if not isinstance(food, BitGrid):
+            return self.getDistanceField(food.asList())
+        field = self.foodFields.get(food.bits)
+        if field is None:
+            eaten = None
+            if previous is not None and isinstance(previous[0], BitGrid) and food.bits & ~previous[0].bits == 0:
+                eaten = previous[0].bits & ~food.bits
+            if (eaten is not None and _popcount(eaten) <= LegalMoves.MAX_REPAIRS
+                    and food.count() >= LegalMoves.MIN_REPAIR_FOOD):
+                field = previous[1]
+                while eaten:
+                    lowest = eaten & -eaten
+                    cell = lowest.bit_length() - 1
+                    field = self.removeSource(field, (cell // self.height, cell % self.height))
+                    eaten ^= lowest
+            else:
+                field = self.getDistanceField(food.asList())
+            if len(self.foodFields) >= LegalMoves.FOOD_FIELDS: self.foodFields.clear()
+            self.foodFields[food.bits] = field
+        return field
+
+    def removeSource(self, field, position):
+        """
+        Returns the distance field left when position is taken away from the
+        positions field was built from.  Only the cells whose shortest paths
+        may all lead to position, those reached from it by steps that add one
+        to the distance, are searched again, outwards from the cells around
+        them whose distances still hold.
+        """
+        x, y = position
+        start = int(x + 0.5) * self.height + int(y + 0.5)
+        adjacent = self.adjacent
+        affected, frontier = set([start]), [start]
+        while frontier:
+            nextFrontier = []
+            for cell in frontier:
+                distance = field[cell] + 1
+                for neighbor in adjacent[cell]:
+                    if field[neighbor] == distance and neighbor not in affected:
+                        affected.add(neighbor)
+                        nextFrontier.append(neighbor)
+            frontier = nextFrontier
+        field = field[:]
+        for cell in affected:
+            field[cell] = None
+
+        buckets = {}
+        for cell in affected:
+            nearest = [field[neighbor] for neighbor in adjacent[cell] if field[neighbor] is not None]
+            if nearest:
+                buckets.setdefault(min(nearest) + 1, []).append(cell)
+        distance = min(buckets) if buckets else 0
+        while buckets:
+            for cell in buckets.pop(distance, ()):
+                if field[cell] is not None: continue
+                field[cell] = distance
+                for neighbor in adjacent[cell]:
+                    if field[neighbor] is None and neighbor in affected:
+                        buckets.setdefault(distance + 1, []).append(neighbor)
+            distance += 1
+        return field
+
+_ZOBRIST_KEYS = {}
+
+def zobristKey( feature ):
+    """
+    Returns the random 64 bit key of a hashable state feature, such as
+    ('food', x, y).  Keys are derived from the feature itself, so they are the
+    same in every process.
+    """
+    key = _ZOBRIST_KEYS.get( feature )
+    if key is None:
+        import random
+        key = _ZOBRIST_KEYS[feature] = random.Random( repr( feature ) ).getrandbits( 64 )
+    return key
+
+def agentZobristKey( index, agentState ):
+    """
+    Returns the Zobrist key of everything about agent index that
+    AgentState.__eq__ looks at: its position, direction and scared timer.
+    """
+    configuration = agentState.configuration
+    if configuration is None:
+        key = zobristKey( ('agent', index, None) )
+    else:
+        # Scared ghosts move at half speed, so the same cell can be (4, 5) or (4.0, 5.0)
+        x, y = configuration.pos
+        key = zobristKey( ('agent', index, float( x ), float( y ), configuration.direction) )
+    if agentState.scaredTimer:
+        key ^= zobristKey( ('scared', index, agentState.scaredTimer) )
+    return key
+
 class GameStateData:
     """
 
@@ -375,14 +814,23 @@ class GameStateData:
     def __init__( self, prevState = None ):
         """
         Generates a new data packet by copying information from its predecessor.
+
+        The food, capsule list and agent states are shared with the
+        predecessor rather than copied.  Code that changes them must replace
+        the food grid or capsule list with a new one, and must get an agent
+        state through writableAgentState, which copies it on first write.
         """
-        if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates( prevState.agentStates )
+        if prevState is not None:
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates[:]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._zobrist = prevState._zobrist
+            self._unhashedAgents = prevState._unhashedAgents
+            self._foodDistances = prevState._foodDistances
+        self._ownedAgents = 0 # Bit i is set once agentStates[i] is private to this packet
 
         self._foodEaten = None
         self._foodAdded = None
@@ -395,6 +843,9 @@ class GameStateData:
     def deepCopy( self ):
         state = GameStateData( self )
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates( self.agentStates )
+        state._ownedAgents = (1 << len(state.agentStates)) - 1
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -402,6 +853,73 @@ class GameStateData:
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def writableAgentState( self, index ):
+        """
+        Returns agentStates[index], first replacing it by a copy if it is
+        still shared with the predecessor.
+
+        The agent's key is taken out of the Zobrist hash here, since the
+        caller is about to change it; __hash__ puts the key of its new
+        contents back in.
+        """
+        if not (self._unhashedAgents >> index) & 1:
+            self._zobrist ^= agentZobristKey( index, self.agentStates[index] )
+            self._unhashedAgents |= 1 << index
+        if not (self._ownedAgents >> index) & 1:
+            self.agentStates[index] = self.agentStates[index].copy()
+            self._ownedAgents |= 1 << index
+        return self.agentStates[index]
+
+    def toggleFoodHash( self, position ):
+        """
+        Updates the Zobrist hash after food is eaten or added at position.
+        """
+        self._zobrist ^= zobristKey( ('food',) + tuple( position ) )
+
+    def toggleCapsuleHash( self, position ):
+        """
+        Updates the Zobrist hash after a capsule is eaten or added at position.
+        """
+        self._zobrist ^= zobristKey( ('capsule',) + tuple( position ) )
+
+    def foodDistances( self ):
+        """
+        Returns the maze distance from every cell to the nearest food, as a
+        list indexed x * height + y.  Successors are handed the field and
+        repair it when they eat food.
+        """
+        cached = self._foodDistances
+        if cached is None or cached[0] is not self.food:
+            field = self.layout.legalMoves.getFoodDistances( self.food, cached )
+            self._foodDistances = cached = ( self.food, field )
+        return cached[1]
+
+    def zobristHash( self ):
+        """
+        Returns the Zobrist hash of the food, capsules and agent states.  It is
+        kept up to date by the game rules, so this is O(1) apart from agents
+        that changed since the last call.
+        """
+        if self._unhashedAgents:
+            unhashed, index = self._unhashedAgents, 0
+            while unhashed:
+                if unhashed & 1:
+                    self._zobrist ^= agentZobristKey( index, self.agentStates[index] )
+                unhashed >>= 1
+                index += 1
+            self._unhashedAgents = 0
+        return self._zobrist
+
+    def _computeZobrist( self ):
+        zobrist = 0
+        for position in self.food.asList():
+            zobrist ^= zobristKey( ('food',) + position )
+        for position in self.capsules:
+            zobrist ^= zobristKey( ('capsule',) + tuple( position ) )
+        for index, agentState in enumerate( self.agentStates ):
+            zobrist ^= agentZobristKey( index, agentState )
+        return zobrist
+
     def copyAgentStates( self, agentStates ):
         copiedStates = []
         for agentState in agentStates:
@@ -424,13 +942,7 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate( self.agentStates ):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                #hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113* hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575 )
+        return hash( (self.zobristHash(), self.score) )
 
     def __str__( self ):
         width, height = self.layout.width, self.layout.height
@@ -488,7 +1000,8 @@ class GameStateData:
         """
         Creates an initial game state from a layout array (see layout.py).
         """
-        self.food = layout.food.copy()
+        self.food = layout.food.toBitGrid()
+        self._foodDistances = None
         #self.capsules = []
         self.capsules = layout.capsules[:]
         self.layout = layout
@@ -502,7 +1015,10 @@ class GameStateData:
                 if numGhosts == numGhostAgents: continue # Max ghosts reached already
                 else: numGhosts += 1
             self.agentStates.append( AgentState( Configuration( pos, Directions.STOP), isPacman) )
+        self._ownedAgents = (1 << len(self.agentStates)) - 1
         self._eaten = [False for a in self.agentStates]
+        self._zobrist = self._computeZobrist()
+        self._unhashedAgents = 0
 
 try:
     import boinc
@@ -515,7 +1031,7 @@ class Game:
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False ):
+    def __init__( self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False, headless=False ):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -524,6 +1040,7 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.headless = headless # Trusted agents and no display: see runHeadless
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
@@ -547,6 +1064,12 @@ class Game:
         self.agentCrashed = True
         self.rules.agentCrash(self, agentIndex)
 
+    def _agentTimeout( self, agentIndex ):
+        "Helper method for ending the game when an agent runs out of time"
+        self.gameOver = True
+        self.agentTimeout = True
+        self.rules.agentCrash(self, agentIndex)
+
     OLD_STDOUT = None
     OLD_STDERR = None
 
@@ -571,6 +1094,7 @@ class Game:
         """
         Main control loop for game play.
         """
+        if self.headless: return self.runHeadless()
         self.display.initialize(self.state.data)
         self.numMoves = 0
 
@@ -582,7 +1106,7 @@ class Game:
                 self.mute(i)
                 # this is a null agent, meaning it failed to load
                 # the other team wins
-                print >>sys.stderr, "Agent %d failed to load" % i
+                print("Agent %d failed to load" % i, file=sys.stderr)
                 self.unmute()
                 self._agentCrash(i, quiet=True)
                 return
@@ -590,17 +1114,16 @@ class Game:
                 self.mute(i)
                 if self.catchExceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.registerInitialState, int(self.rules.getMaxStartupTime(i)))
+                        timed_func = TimeoutFunction(agent.registerInitialState, self.rules.getMaxStartupTime(i))
                         try:
-                            start_time = time.time()
+                            start_time = time.perf_counter()
                             timed_func(self.state.deepCopy())
-                            time_taken = time.time() - start_time
+                            time_taken = time.perf_counter() - start_time
                             self.totalAgentTimes[i] += time_taken
                         except TimeoutFunctionException:
-                            print >>sys.stderr, "Agent %d ran out of time on startup!" % i
+                            print("Agent %d ran out of time on startup!" % i, file=sys.stderr)
                             self.unmute()
-                            self.agentTimeout = True
-                            self._agentCrash(i, quiet=True)
+                            self._agentTimeout(i)
                             return
                     except Exception as data:
                         self._agentCrash(i, quiet=False)
@@ -624,13 +1147,13 @@ class Game:
                 self.mute(agentIndex)
                 if self.catchExceptions:
                     try:
-                        timed_func = TimeoutFunction(agent.observationFunction, int(self.rules.getMoveTimeout(agentIndex)))
+                        timed_func = TimeoutFunction(agent.observationFunction, self.rules.getMoveTimeout(agentIndex))
                         try:
-                            start_time = time.time()
+                            start_time = time.perf_counter()
                             observation = timed_func(self.state.deepCopy())
                         except TimeoutFunctionException:
                             skip_action = True
-                        move_time += time.time() - start_time
+                        move_time += time.perf_counter() - start_time
                         self.unmute()
                     except Exception as data:
                         self._agentCrash(agentIndex, quiet=False)
@@ -647,37 +1170,34 @@ class Game:
             self.mute(agentIndex)
             if self.catchExceptions:
                 try:
-                    timed_func = TimeoutFunction(agent.getAction, int(self.rules.getMoveTimeout(agentIndex)) - int(move_time))
+                    timed_func = TimeoutFunction(agent.getAction, self.rules.getMoveTimeout(agentIndex) - move_time)
                     try:
-                        start_time = time.time()
+                        start_time = time.perf_counter()
                         if skip_action:
                             raise TimeoutFunctionException()
                         action = timed_func( observation )
                     except TimeoutFunctionException:
-                        print >>sys.stderr, "Agent %d timed out on a single move!" % agentIndex
-                        self.agentTimeout = True
-                        self._agentCrash(agentIndex, quiet=True)
+                        print("Agent %d timed out on a single move!" % agentIndex, file=sys.stderr)
+                        self._agentTimeout(agentIndex)
                         self.unmute()
                         return
 
-                    move_time += time.time() - start_time
+                    move_time += time.perf_counter() - start_time
 
                     if move_time > self.rules.getMoveWarningTime(agentIndex):
                         self.totalAgentTimeWarnings[agentIndex] += 1
-                        print >>sys.stderr, "Agent %d took too long to make a move! This is warning %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex])
+                        print("Agent %d took too long to make a move! This is warning %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex]), file=sys.stderr)
                         if self.totalAgentTimeWarnings[agentIndex] > self.rules.getMaxTimeWarnings(agentIndex):
-                            print >>sys.stderr, "Agent %d exceeded the maximum number of warnings: %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex])
-                            self.agentTimeout = True
-                            self._agentCrash(agentIndex, quiet=True)
+                            print("Agent %d exceeded the maximum number of warnings: %d" % (agentIndex, self.totalAgentTimeWarnings[agentIndex]), file=sys.stderr)
+                            self._agentTimeout(agentIndex)
                             self.unmute()
                             return
 
                     self.totalAgentTimes[agentIndex] += move_time
                     #print "Agent: %d, time: %f, total: %f" % (agentIndex, move_time, self.totalAgentTimes[agentIndex])
                     if self.totalAgentTimes[agentIndex] > self.rules.getMaxTotalTime(agentIndex):
-                        print >>sys.stderr, "Agent %d ran out of time! (time: %1.2f)" % (agentIndex, self.totalAgentTimes[agentIndex])
-                        self.agentTimeout = True
-                        self._agentCrash(agentIndex, quiet=True)
+                        print("Agent %d ran out of time! (time: %1.2f)" % (agentIndex, self.totalAgentTimes[agentIndex]), file=sys.stderr)
+                        self._agentTimeout(agentIndex)
                         self.unmute()
                         return
                     self.unmute()
@@ -730,3 +1250,43 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def runHeadless( self ):
+        """
+        The control loop without the safeguards, for agents that are trusted
+        and games nobody watches.  The agents' hooks are looked up once, and
+        each agent observes the game's own state rather than a deep copy: it
+        must treat the state as read-only (generateSuccessor is fine).  There
+        are no timeouts, no muting and no display.
+        """
+        self.numMoves = 0
+        agents = self.agents
+        for i, agent in enumerate(agents):
+            if not agent:
+                sys.stderr.write("Agent %d failed to load\n" % i)
+                self._agentCrash(i, quiet=True)
+                return
+        observationFunctions = [getattr(agent, 'observationFunction', None) for agent in agents]
+        getActions = [agent.getAction for agent in agents]
+        for agent in agents:
+            registerInitialState = getattr(agent, 'registerInitialState', None)
+            if registerInitialState is not None:
+                registerInitialState(self.state.deepCopy())
+
+        agentIndex = self.startingIndex
+        numAgents = len( agents )
+        rules, moveHistory = self.rules, self.moveHistory
+        while not self.gameOver:
+            observation = self.state
+            if observationFunctions[agentIndex] is not None:
+                observation = observationFunctions[agentIndex](observation)
+            action = getActions[agentIndex](observation)
+            moveHistory.append( (agentIndex, action) )
+            self.state = self.state.generateSuccessor( agentIndex, action )
+            rules.process(self.state, self)
+            agentIndex = ( agentIndex + 1 ) % numAgents
+
+        for agent in agents:
+            final = getattr(agent, 'final', None)
+            if final is not None:
+                final( self.state )
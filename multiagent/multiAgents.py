@@ -13,10 +13,11 @@
 
 
 from util import manhattanDistance
-from game import Directions
+from game import Directions, Actions
 import random, util
 
 from game import Agent
+import time
 
 class ReflexAgent(Agent):
     """
@@ -104,6 +105,67 @@ def scoreEvaluationFunction(currentGameState):
     """
     return currentGameState.getScore()
 
+# An evaluation function can also score many states in one call through its
+# batch attribute, a function from a list of states to a list of values.
+# The search agents hand it all the leaves below a node together.
+
+def scoreEvaluationBatch(gameStates):
+    return [gameState.getScore() for gameState in gameStates]
+scoreEvaluationFunction.batch = scoreEvaluationBatch
+
+def leafFeatures(gameStates):
+    """
+      Computes the features betterEvaluationFunction looks at for a batch of
+      states.  The maze distances come from GameState.getFoodDistance and
+      getMazeDistance, whose distance fields are kept between calls: leaves
+      below the same node nearly always have the same food, and so share a
+      food distance field.
+
+      Returns one (score, numFood, foodDistance, numCapsules, ghosts) tuple per
+      state, where ghosts holds a (distance, scaredTimer) pair per ghost.
+    """
+    features = []
+    for gameState in gameStates:
+        pacman = gameState.getPacmanPosition()
+        ghosts = [(gameState.getMazeDistance(pacman, ghostState.getPosition()), ghostState.scaredTimer)
+                  for ghostState in gameState.getGhostStates()]
+        features.append((gameState.getScore(), gameState.getNumFood(), gameState.getFoodDistance(),
+                         len(gameState.getCapsules()), ghosts))
+    return features
+
+class SearchTimeout(Exception):
+    """Raised inside a search when the time budget for the move has run out"""
+    pass
+
+# The part of the game's time for a move that a timed search leaves unused,
+# to return its action before the game gives up on it, and the least time
+# left that way in seconds.
+MOVE_BUDGET_MARGIN = 0.1
+MIN_MOVE_BUDGET_MARGIN = 0.05
+
+# Seconds per move for timeBudget=auto when the game gives the move no budget
+DEFAULT_AUTO_TIME_BUDGET = 1.0
+
+# The best root value found so far in the current parallel search, shared
+# with the worker processes so that alpha-beta can prune against it.
+_sharedAlpha = None
+
+def _initSearchWorker(sharedAlpha):
+    global _sharedAlpha
+    _sharedAlpha = sharedAlpha
+
+def _searchSubtree(agent, gameState, currDepth, agentIndex, seed, useAlpha):
+    """
+      Runs in a worker process: returns the value of gameState with agentIndex
+      to move, and the number of nodes expanded to find it.
+    """
+    random.seed(seed)
+    alpha = float('-inf')
+    if useAlpha and _sharedAlpha is not None:
+        alpha = _sharedAlpha.value
+    value = agent.nodeValue(gameState, currDepth, agentIndex, alpha)
+    return value, agent.nodesExpanded
+
 class MultiAgentSearchAgent(Agent):
     """
       This class provides some common elements to all of your
@@ -119,10 +181,259 @@ class MultiAgentSearchAgent(Agent):
       is another abstract class.
     """
 
-    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2'):
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', tableSize = '0', replacement = 'lru',
+                 timeBudget = '0', maxDepth = '50', workers = '0', parallelPly = '1', stats = 'False'):
         self.index = 0 # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        # Iterative deepening: with a time budget (seconds per move, or 'auto'),
+        # depth is ignored and each move searches as deep as the budget allows.
+        self.timeBudget = self.getTimeBudget(timeBudget)
+        self.maxDepth = int(maxDepth)
+        self.deadline = None
+        self.depthsReached = []
+        self.nodesExpanded = 0
+        # Optional transposition table, kept for the whole game (e.g. -a tableSize=100000)
+        self.transpositionTable = None
+        if int(tableSize) > 0:
+            self.transpositionTable = util.TranspositionTable(int(tableSize), replacement)
+        # Parallel mode (e.g. -a workers=16): the subtrees below the root, or
+        # below the first ghost's replies with parallelPly=2, are searched in
+        # worker processes.  Workers do not share the transposition table.
+        self.workers = int(workers)
+        self.parallelPly = int(parallelPly)
+        self.pool = None
+        self.sharedAlpha = None
+        self.subtreeSeeds = random.Random(0) # Keeps parallel search off the game's random stream
+        # With -a stats=True, the search statistics are printed after each game
+        self.stats = str(stats) in ('True', 'true', '1')
+
+    def __getstate__(self):
+        # What a worker process needs: no pool and no transposition table
+        state = self.__dict__.copy()
+        state['pool'] = None
+        state['sharedAlpha'] = None
+        state['transpositionTable'] = None
+        state['nodesExpanded'] = 0
+        return state
+
+    def registerInitialState(self, gameState):
+        """
+          Starts each game with an empty transposition table.
+        """
+        if self.transpositionTable is not None:
+            self.transpositionTable.clear()
+        self.nodesExpanded = 0
+
+    def final(self, gameState):
+        if not self.stats: return
+        print('Search nodes expanded: %d' % self.nodesExpanded)
+        if self.transpositionTable is not None:
+            print('Transposition table: %s' % self.transpositionTable)
+        if self.depthsReached:
+            print('Search depth reached per move: min %d, average %.2f, max %d' % (
+                min(self.depthsReached), sum(self.depthsReached) / float(len(self.depthsReached)),
+                max(self.depthsReached)))
+
+    def getTimeBudget(self, timeBudget):
+        """
+          Returns the time budget per move in seconds, or 'auto', which
+          moveDeadline turns into a deadline when each move starts.
+        """
+        if timeBudget == 'auto':
+            return timeBudget
+        return float(timeBudget)
+
+    def searchRoot(self, gameState):
+        """
+          Returns the best action for a search of self.depth plies.
+        """
+        util.raiseNotDefined()
+
+    def searchAction(self, gameState):
+        """
+          Returns the action chosen by searchRoot.  With a time budget, this
+          searches to depth 1, 2, 3... and returns the action from the deepest
+          search that finished in time; depth 1 is always finished.  The depth
+          reached is appended to self.depthsReached.
+        """
+        search = self.searchRoot
+        if self.workers > 1:
+            search = self.parallelSearchRoot
+        if not self.timeBudget:
+            return search(gameState)
+
+        deadline = self.moveDeadline()
+        fixedDepth = self.depth
+        try:
+            self.depth = 1
+            action = search(gameState)
+            self.deadline = deadline
+            while self.depth < self.maxDepth:
+                self.depth += 1
+                action = search(gameState)
+        except SearchTimeout:
+            self.depth -= 1
+        finally:
+            self.depthsReached.append(self.depth)
+            self.depth = fixedDepth
+            self.deadline = None
+        return action
+
+    def nodeValue(self, gameState, currDepth, agentIndex, alpha = float('-inf')):
+        """
+          Returns the value of gameState searched from currDepth with
+          agentIndex to move.  Searches that prune may return any value below
+          alpha once they know the true value is lower still.
+        """
+        util.raiseNotDefined()
+
+    def ghostReplies(self, gameState, ghostIndex):
+        """
+          Returns the replies the search considers for the ghost, as a list
+          of (action, probability) pairs.  The probability is None for ghosts
+          that are assumed to minimize.
+        """
+        return [(action, None) for action in gameState.getLegalActions(ghostIndex)]
+
+    def combineReplies(self, replies, values):
+        """
+          Returns the value of a ghost's node given the values of its replies.
+        """
+        if replies[0][1] is None:
+            return min(values)
+        return sum([probability * value for (action, probability), value in zip(replies, values)])
+
+    def getPool(self):
+        if self.pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self.sharedAlpha = multiprocessing.RawValue('d', float('-inf'))
+            self.pool = ProcessPoolExecutor(self.workers, initializer = _initSearchWorker,
+                                            initargs = (self.sharedAlpha,))
+        return self.pool
+
+    def parallelSearchRoot(self, gameState):
+        """
+          Returns the same action as searchRoot, searching the subtrees below
+          the root in worker processes.  With parallelPly=2 each of the first
+          ghost's replies gets its own worker instead.
+
+          Workers read the best root value found so far when they start, so
+          alpha-beta prunes against it (unless they search one of the
+          chance outcomes of a ghost, whose values are averaged).  Only subtrees that cannot be best
+          are pruned, and the action picked is the first best one in
+          getLegalActions order, so the result does not depend on timing.
+          Each subtree reseeds random from a number drawn from the agent's
+          own stream, so a fixed seed gives the same results every run and
+          the game's random stream is the same as in a serial search.
+        """
+        from concurrent.futures import wait, FIRST_COMPLETED
+        pool = self.getPool()
+        self.sharedAlpha.value = float('-inf')
+        numAgents = gameState.getNumAgents()
+        actions = gameState.getLegalActions(0)
+        self.nodesExpanded += 1
+
+        # One job per subtree: jobs[future] = (root action index, reply index)
+        jobs, replies, values = {}, {}, {}
+        for rootIndex, action in enumerate(actions):
+            successor = gameState.generateSuccessor(0, action)
+            useAlpha = True
+            if self.parallelPly < 2 or successor.isWin() or successor.isLose() or self.depth == 0:
+                children = [(successor, 0, 1)]
+            else:
+                self.nodesExpanded += 1
+                nextAgent, nextDepth = 2, 0
+                if numAgents == 2: nextAgent, nextDepth = 0, 1
+                replies[rootIndex] = self.ghostReplies(successor, 1)
+                children = [(successor.generateSuccessor(1, reply), nextDepth, nextAgent)
+                            for reply, probability in replies[rootIndex]]
+                useAlpha = replies[rootIndex][0][1] is None
+            values[rootIndex] = [None] * len(children)
+            for replyIndex, (child, currDepth, agentIndex) in enumerate(children):
+                future = pool.submit(_searchSubtree, self, child, currDepth, agentIndex,
+                                     self.subtreeSeeds.getrandbits(32), useAlpha)
+                jobs[future] = (rootIndex, replyIndex)
+
+        pending = set(jobs)
+        try:
+            while pending:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                for future in done:
+                    rootIndex, replyIndex = jobs[future]
+                    value, nodes = future.result()
+                    self.nodesExpanded += nodes
+                    values[rootIndex][replyIndex] = value
+                    if None not in values[rootIndex]:
+                        if rootIndex in replies:
+                            values[rootIndex] = self.combineReplies(replies[rootIndex], values[rootIndex])
+                        else:
+                            values[rootIndex] = value
+                        self.sharedAlpha.value = max(self.sharedAlpha.value, values[rootIndex])
+        except SearchTimeout:
+            for future in pending: future.cancel()
+            raise
+
+        bestValue, bestAction = float('-inf'), None
+        for rootIndex, action in enumerate(actions):
+            if bestAction is None or values[rootIndex] > bestValue:
+                bestValue, bestAction = values[rootIndex], action
+        return bestAction
+
+    def evaluateLeaves(self, gameStates):
+        """
+          Returns the evaluation of each state, in one call when the
+          evaluation function has a batch version.
+        """
+        batch = getattr(self.evaluationFunction, 'batch', None)
+        if batch is None:
+            return [self.evaluationFunction(gameState) for gameState in gameStates]
+        return batch(gameStates)
+
+    def moveDeadline(self):
+        """
+          Returns the time.perf_counter() time at which this move's search
+          must stop: timeBudget seconds from now, or sooner if the game has
+          given the move less time than that (see util.MoveBudget).  With
+          timeBudget 'auto' the search uses all of the game's budget, or
+          DEFAULT_AUTO_TIME_BUDGET seconds if there is none.
+        """
+        budget = util.getMoveBudget()
+        if self.timeBudget != 'auto':
+            deadline = time.perf_counter() + self.timeBudget
+        elif budget is None:
+            deadline = time.perf_counter() + DEFAULT_AUTO_TIME_BUDGET
+        else:
+            deadline = float('inf')
+        if budget is not None:
+            margin = max(MOVE_BUDGET_MARGIN * budget.seconds, MIN_MOVE_BUDGET_MARGIN)
+            deadline = min(deadline, budget.deadline - margin)
+        return deadline
+
+    def checkDeadline(self):
+        """
+          Abandons the current search if the move's time budget has run out.
+        """
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def lookupValue(self, gameState, currDepth, agentIndex):
+        """
+          Returns the cached value of gameState searched from currDepth with
+          agentIndex to move, or None if it is not cached.
+        """
+        if self.transpositionTable is None: return None
+        return self.transpositionTable.lookup(gameState, self.depth - currDepth, agentIndex)
+
+    def storeValue(self, gameState, currDepth, agentIndex, value):
+        """
+          Caches the value of gameState searched from currDepth with agentIndex
+          to move, and returns the value.
+        """
+        if self.transpositionTable is not None:
+            self.transpositionTable.store(gameState, self.depth - currDepth, agentIndex, value)
+        return value
 
 class MinimaxAgent(MultiAgentSearchAgent):
     """
@@ -146,8 +457,14 @@ class MinimaxAgent(MultiAgentSearchAgent):
           gameState.getNumAgents():
             Returns the total number of agents in the game
         """
+        return self.searchAction(gameState)
 
+    def searchRoot(self, gameState):
+        """
+          Returns the minimax action for a search of self.depth plies.
+        """
         # Retrieve all legal actions as well as set a default maxRes and maxAction.
+        self.nodesExpanded += 1
         legalActions = gameState.getLegalActions(0)
         maxRes = float('-inf')
         maxAction = None
@@ -166,6 +483,11 @@ class MinimaxAgent(MultiAgentSearchAgent):
                 maxAction = action
         return maxAction
 
+    def nodeValue(self, gameState, currDepth, agentIndex, alpha = float('-inf')):
+        if agentIndex == 0:
+            return self.maxValue(gameState, currDepth)
+        return self.minValue(gameState, currDepth, agentIndex)
+
     def minValue(self, gameState, currDepth, currAgent):
         """
           Returns the minimum value for a given game state and current agent.
@@ -175,16 +497,28 @@ class MinimaxAgent(MultiAgentSearchAgent):
         if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
             return self.evaluationFunction(gameState)
 
+        self.checkDeadline()
+
+        # Ghost moves commute, so the same position is often reached twice.
+        cached = self.lookupValue(gameState, currDepth, currAgent)
+        if cached is not None:
+            return cached
+
+        self.nodesExpanded += 1
         legalActions = gameState.getLegalActions(currAgent)
         successors = [gameState.generateSuccessor(currAgent, action) for action in legalActions]
         agents = gameState.getNumAgents()
 
         if currAgent < agents - 1:
             # There are still some ghosts to choose their moves, so increase the agent index and call minValue again.
-            return min([self.minValue(s, currDepth, currAgent + 1) for s in successors])
+            value = min([self.minValue(s, currDepth, currAgent + 1) for s in successors])
+        elif currDepth + 1 == self.depth:
+            # Every successor is a leaf, so they are evaluated together.
+            value = min(self.evaluateLeaves(successors))
         else:
             # Depth is increased when it is max's turn.
-            return min([self.maxValue(s, currDepth + 1) for s in successors])
+            value = min([self.maxValue(s, currDepth + 1) for s in successors])
+        return self.storeValue(gameState, currDepth, currAgent, value)
     
     def maxValue(self, gameState, currDepth):
         """
@@ -195,29 +529,242 @@ class MinimaxAgent(MultiAgentSearchAgent):
         if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
             return self.evaluationFunction(gameState)
 
+        self.checkDeadline()
+
+        cached = self.lookupValue(gameState, currDepth, 0)
+        if cached is not None:
+            return cached
+
+        self.nodesExpanded += 1
         legalActions = gameState.getLegalActions(0)
         successors = [gameState.generateSuccessor(0, action) for action in legalActions]
 
         # Pacman plays next, we compute the maximum value of the successor states.
-        return max([self.minValue(s, currDepth, 1) for s in successors])
+        value = max([self.minValue(s, currDepth, 1) for s in successors])
+        return self.storeValue(gameState, currDepth, 0, value)
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
       Your minimax agent with alpha-beta pruning (question 3)
+
+      By default actions are searched in getLegalActions order, which is what
+      the autograder expects.  With -a ordering=True each node tries first
+      the best action of the previous iteration (at the root) or of the
+      transposition table, then killer actions that caused a cutoff at the
+      same ply, then actions with a high history score, and finally actions
+      that a cheap static test likes: for Pacman, steps towards the nearest
+      food and away from ghosts; for ghosts, steps towards Pacman.
     """
+    EXACT, LOWER, UPPER = 0, 1, 2 # How a cached value bounds the true value
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ordering = 'False', **args):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, **args)
+        self.ordering = str(ordering) in ('True', 'true', '1')
+        self.history = util.Counter()
+        self.killers = {}
+        self.rootBestAction = None
+
+    def registerInitialState(self, gameState):
+        MultiAgentSearchAgent.registerInitialState(self, gameState)
+        self.history = util.Counter()
 
     def getAction(self, gameState):
         """
           Returns the minimax action using self.depth and self.evaluationFunction
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        self.killers = {}
+        self.rootBestAction = None
+        return self.searchAction(gameState)
+
+    def searchRoot(self, gameState):
+        """
+          Returns the minimax action for a search of self.depth plies,
+          pruning branches that cannot change it.
+        """
+        alpha, beta = float('-inf'), float('inf')
+        bestValue, bestAction = float('-inf'), None
+        self.nodesExpanded += 1
+        for action in self.orderActions(gameState, 0, 0, self.rootBestAction):
+            value = self.minValue(gameState.generateSuccessor(0, action), 0, 1, alpha, beta)
+            if bestAction is None or value > bestValue:
+                bestValue, bestAction = value, action
+            alpha = max(alpha, bestValue)
+        self.rootBestAction = bestAction
+        return bestAction
+
+    def nodeValue(self, gameState, currDepth, agentIndex, alpha = float('-inf')):
+        if agentIndex == 0:
+            return self.maxValue(gameState, currDepth, alpha, float('inf'))
+        return self.minValue(gameState, currDepth, agentIndex, alpha, float('inf'))
+
+    def maxValue(self, gameState, currDepth, alpha, beta):
+        """
+          Returns Pacman's minimax value, or a bound on it outside (alpha, beta).
+        """
+        if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
+            return self.evaluationFunction(gameState)
+        self.checkDeadline()
+
+        cached, hashAction = self.lookupBound(gameState, currDepth, 0, alpha, beta)
+        if cached is not None:
+            return cached
+
+        self.nodesExpanded += 1
+        window = (alpha, beta)
+        value, bestAction = float('-inf'), None
+        for action in self.orderActions(gameState, 0, currDepth, hashAction):
+            successorValue = self.minValue(gameState.generateSuccessor(0, action), currDepth, 1, alpha, beta)
+            if successorValue > value:
+                value, bestAction = successorValue, action
+            # Prune only on strict inequality, as the autograder expects
+            if value > beta:
+                self.recordCutoff(gameState, 0, currDepth, action)
+                break
+            alpha = max(alpha, value)
+        return self.storeBound(gameState, currDepth, 0, value, window, bestAction)
+
+    def minValue(self, gameState, currDepth, currAgent, alpha, beta):
+        """
+          Returns the value of a ghost's move, or a bound on it outside (alpha, beta).
+        """
+        if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
+            return self.evaluationFunction(gameState)
+        self.checkDeadline()
+
+        cached, hashAction = self.lookupBound(gameState, currDepth, currAgent, alpha, beta)
+        if cached is not None:
+            return cached
+
+        self.nodesExpanded += 1
+        lastGhost = currAgent == gameState.getNumAgents() - 1
+        window = (alpha, beta)
+        value, bestAction = float('inf'), None
+        for action in self.orderActions(gameState, currAgent, currDepth, hashAction):
+            successor = gameState.generateSuccessor(currAgent, action)
+            if lastGhost:
+                successorValue = self.maxValue(successor, currDepth + 1, alpha, beta)
+            else:
+                successorValue = self.minValue(successor, currDepth, currAgent + 1, alpha, beta)
+            if successorValue < value:
+                value, bestAction = successorValue, action
+            if value < alpha:
+                self.recordCutoff(gameState, currAgent, currDepth, action)
+                break
+            beta = min(beta, value)
+        return self.storeBound(gameState, currDepth, currAgent, value, window, bestAction)
+
+    def lookupBound(self, gameState, currDepth, agentIndex, alpha, beta):
+        """
+          Returns (value, action) from the transposition table.  value is None
+          unless the cached result settles the node for the window
+          (alpha, beta); action is the best action found last time, if any.
+        """
+        entry = self.lookupValue(gameState, currDepth, agentIndex)
+        if entry is None:
+            return None, None
+        value, bound, action = entry
+        if bound == self.EXACT or (bound == self.LOWER and value > beta) or (bound == self.UPPER and value < alpha):
+            return value, action
+        return None, action
+
+    def storeBound(self, gameState, currDepth, agentIndex, value, window, action):
+        """
+          Caches value along with whether it is exact or only a bound, given
+          the (alpha, beta) window the node was entered with, and returns it.
+        """
+        if self.transpositionTable is not None:
+            alpha, beta = window
+            if value <= alpha: bound = self.UPPER
+            elif value >= beta: bound = self.LOWER
+            else: bound = self.EXACT
+            self.storeValue(gameState, currDepth, agentIndex, (value, bound, action))
+        return value
+
+    def recordCutoff(self, gameState, agentIndex, currDepth, action):
+        """
+          Remembers an action that caused a cutoff, for ordering.
+        """
+        if not self.ordering: return
+        position = self.agentPosition(gameState, agentIndex)
+        self.history[(agentIndex, position, action)] += (self.depth - currDepth) ** 2
+        killers = self.killers.setdefault((currDepth, agentIndex), [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+
+    def agentPosition(self, gameState, agentIndex):
+        if agentIndex == 0:
+            return gameState.getPacmanPosition()
+        return gameState.getGhostPosition(agentIndex)
+
+    def orderActions(self, gameState, agentIndex, currDepth, firstAction = None):
+        """
+          Returns the legal actions of the agent, best first when ordering is
+          on.  The static test is only run where the subtree below is big
+          enough to repay it.
+        """
+        actions = gameState.getLegalActions(agentIndex)
+        if not self.ordering or len(actions) < 2:
+            return actions
+        position = self.agentPosition(gameState, agentIndex)
+        killers = self.killers.get((currDepth, agentIndex), ())
+        if self.depth - currDepth >= 2:
+            static = self.staticScores(gameState, agentIndex, position, actions)
+        else:
+            static = [0] * len(actions)
+        keys = {}
+        for action, score in zip(actions, static):
+            keys[action] = (action != firstAction, action not in killers,
+                            -self.history[(agentIndex, position, action)], -score)
+        return sorted(actions, key = keys.get)
+
+    def staticScores(self, gameState, agentIndex, position, actions):
+        """
+          Scores each action from the mover's point of view using Manhattan
+          distances only; higher is better.
+        """
+        successors = [Actions.getSuccessor(position, action) for action in actions]
+        if agentIndex == 0:
+            food = gameState.getFood().asList()
+            ghosts = [ghost.getPosition() for ghost in gameState.getGhostStates() if ghost.scaredTimer == 0]
+            scores = []
+            for successor in successors:
+                score = -min([manhattanDistance(successor, dot) for dot in food] or [0])
+                if min([manhattanDistance(successor, ghost) for ghost in ghosts] or [2]) <= 1:
+                    score -= 1000
+                scores.append(score)
+            return scores
+        pacmanPosition = gameState.getPacmanPosition()
+        sign = 1 if gameState.getGhostState(agentIndex).scaredTimer > 0 else -1
+        return [sign * manhattanDistance(successor, pacmanPosition) for successor in successors]
 
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
       Your expectimax agent (question 4)
+
+      By default every ghost picks uniformly among its legal moves.  Options
+      make deeper searches affordable:
+
+        ghostModel=DirectionalGhost  use that ghostAgents class's getDistribution
+        probThreshold=0.1            ignore replies less likely than this
+        samples=3                    average over 3 sampled replies per ghost
+        evalBounds=-1000:3000        the evaluation function never leaves this
+                                     range; enables Star1/Star2 pruning
     """
 
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', ghostModel = 'uniform',
+                 probThreshold = '0', samples = '0', evalBounds = None, seed = '0', **args):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, **args)
+        self.ghostModel = ghostModel
+        self.ghostModels = {}
+        self.probThreshold = float(probThreshold)
+        self.samples = int(samples)
+        self.evalBounds = None
+        if evalBounds is not None:
+            lower, upper = [float(bound) for bound in evalBounds.split(':')]
+            self.evalBounds = (lower, upper)
+        self.random = random.Random(int(seed)) # Keeps sampling off the game's random stream
+
     def getAction(self, gameState):
         """
           Returns the expectimax action using self.depth and self.evaluationFunction
@@ -225,18 +772,405 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
           All ghosts should be modeled as choosing uniformly at random from their
           legal moves.
         """
-        "*** YOUR CODE HERE ***"
-        util.raiseNotDefined()
+        return self.searchAction(gameState)
+
+    def searchRoot(self, gameState):
+        """
+          Returns the expectimax action for a search of self.depth plies.
+        """
+        alpha = float('-inf')
+        bestValue, bestAction = float('-inf'), None
+        self.nodesExpanded += 1
+        for action in gameState.getLegalActions(0):
+            value = self.expValue(gameState.generateSuccessor(0, action), 0, 1, alpha, float('inf'))
+            if bestAction is None or value > bestValue:
+                bestValue, bestAction = value, action
+            alpha = max(alpha, bestValue)
+        return bestAction
+
+    def nodeValue(self, gameState, currDepth, agentIndex, alpha = float('-inf')):
+        if agentIndex == 0:
+            return self.maxValue(gameState, currDepth, alpha, float('inf'))
+        return self.expValue(gameState, currDepth, agentIndex, alpha, float('inf'))
+
+    def ghostReplies(self, gameState, ghostIndex):
+        return self.chanceOutcomes(gameState, ghostIndex)
+
+    def chanceOutcomes(self, gameState, ghostIndex):
+        """
+          Returns the (action, probability) pairs searched below a ghost's
+          chance node.  The probabilities add up to one.
+        """
+        if self.ghostModel == 'uniform':
+            actions = gameState.getLegalActions(ghostIndex)
+            outcomes = [(action, 1.0 / len(actions)) for action in actions]
+        else:
+            if ghostIndex not in self.ghostModels:
+                import ghostAgents
+                self.ghostModels[ghostIndex] = getattr(ghostAgents, self.ghostModel)(ghostIndex)
+            distribution = self.ghostModels[ghostIndex].getDistribution(gameState)
+            outcomes = [(action, distribution[action]) for action in gameState.getLegalActions(ghostIndex)
+                        if distribution[action] > 0]
+
+        if self.probThreshold > 0:
+            likely = [outcome for outcome in outcomes if outcome[1] >= self.probThreshold]
+            if not likely:
+                likely = [max(outcomes, key = lambda outcome: outcome[1])]
+            if len(likely) < len(outcomes):
+                total = float(sum([probability for action, probability in likely]))
+                outcomes = [(action, probability / total) for action, probability in likely]
+
+        if self.samples > 0 and len(outcomes) > self.samples:
+            counts = util.Counter()
+            for i in range(self.samples):
+                choice, cumulative = self.random.random(), 0.0
+                for action, probability in outcomes:
+                    cumulative += probability
+                    if choice < cumulative: break
+                counts[action] += 1
+            outcomes = [(action, counts[action] / float(self.samples)) for action, p in outcomes if counts[action]]
+        return outcomes
+
+    def maxValue(self, gameState, currDepth, alpha, beta, probe = None):
+        """
+          Returns Pacman's expectimax value, or a bound on it outside
+          (alpha, beta).  probe is an (action, value) pair already searched.
+        """
+        if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
+            return self.evaluationFunction(gameState)
+        self.checkDeadline()
+
+        cached = self.lookupValue(gameState, currDepth, 0)
+        if cached is not None:
+            return cached
+
+        self.nodesExpanded += 1
+        originalAlpha = alpha
+        value = float('-inf')
+        for action in gameState.getLegalActions(0):
+            if probe is not None and action == probe[0]:
+                successorValue = probe[1]
+            else:
+                successorValue = self.expValue(gameState.generateSuccessor(0, action), currDepth, 1, alpha, beta)
+            value = max(value, successorValue)
+            if value >= beta:
+                return value
+            alpha = max(alpha, value)
+        if value > originalAlpha:
+            self.storeValue(gameState, currDepth, 0, value)
+        return value
+
+    def expValue(self, gameState, currDepth, currAgent, alpha, beta):
+        """
+          Returns the expected value of a ghost's move, or a bound on it
+          outside (alpha, beta) when evaluation bounds are known.
+        """
+        if gameState.isWin() or gameState.isLose() or currDepth == self.depth:
+            return self.evaluationFunction(gameState)
+        self.checkDeadline()
+
+        cached = self.lookupValue(gameState, currDepth, currAgent)
+        if cached is not None:
+            return cached
+
+        self.nodesExpanded += 1
+        lastGhost = currAgent == gameState.getNumAgents() - 1
+        outcomes = self.chanceOutcomes(gameState, currAgent)
+
+        if self.evalBounds is None and lastGhost and currDepth + 1 == self.depth:
+            successors = [gameState.generateSuccessor(currAgent, action) for action, probability in outcomes]
+            values = self.evaluateLeaves(successors)
+            value = sum([probability * v for (action, probability), v in zip(outcomes, values)])
+            return self.storeValue(gameState, currDepth, currAgent, value)
+        if self.evalBounds is None:
+            value = 0.0
+            for action, probability in outcomes:
+                successor = gameState.generateSuccessor(currAgent, action)
+                if lastGhost:
+                    value += probability * self.maxValue(successor, currDepth + 1, alpha, beta)
+                else:
+                    value += probability * self.expValue(successor, currDepth, currAgent + 1, alpha, beta)
+            return self.storeValue(gameState, currDepth, currAgent, value)
+        return self.starValue(gameState, currDepth, currAgent, outcomes, lastGhost, alpha, beta)
+
+    def starValue(self, gameState, currDepth, currAgent, outcomes, lastGhost, alpha, beta):
+        """
+          Star1 pruning: once the searched replies, with the rest assumed to
+          score the lowest or highest evaluation, already place the node
+          outside (alpha, beta), the rest are skipped and that bound returned.
+          Each reply is searched with the window that could still matter.
+
+          When the replies lead to Pacman's moves (Star2), each reply's first
+          Pacman move is probed first, as it gives a lower bound on the reply.
+        """
+        lower, upper = self.evalBounds
+        successors = [gameState.generateSuccessor(currAgent, action) for action, probability in outcomes]
+        floors = [lower] * len(outcomes)
+        probes = [None] * len(outcomes)
+
+        if lastGhost and currDepth + 1 < self.depth:
+            for i, successor in enumerate(successors):
+                if successor.isWin() or successor.isLose(): continue
+                action = successor.getLegalActions(0)[0]
+                value = self.expValue(successor.generateSuccessor(0, action), currDepth + 1, 1, lower, upper)
+                floors[i], probes[i] = value, (action, value)
+            floor = sum([p * f for (a, p), f in zip(outcomes, floors)])
+            if floor >= beta:
+                return floor
+
+        searched = 0.0
+        restLower = sum([p * f for (a, p), f in zip(outcomes, floors)])
+        restUpper = upper * sum([p for a, p in outcomes])
+        for i, (action, probability) in enumerate(outcomes):
+            restLower -= probability * floors[i]
+            restUpper -= probability * upper
+            childAlpha = max(floors[i], (alpha - searched - restUpper) / probability)
+            childBeta = min(upper, (beta - searched - restLower) / probability)
+            if lastGhost:
+                value = self.maxValue(successors[i], currDepth + 1, childAlpha, childBeta, probes[i])
+            else:
+                value = self.expValue(successors[i], currDepth, currAgent + 1, childAlpha, childBeta)
+            searched += probability * value
+            if searched + restUpper <= alpha:
+                return searched + restUpper
+            if searched + restLower >= beta:
+                return searched + restLower
+        return self.storeValue(gameState, currDepth, currAgent, searched)
+
+def _searchMonteCarlo(agent, gameState, seed):
+    """
+      Runs in a worker process: grows a tree from gameState and returns the
+      root's statistics as {action: (visits, totalValue)}, and the number of
+      iterations run.
+    """
+    agent.random = random.Random(seed)
+    root = agent.growTree(gameState, MonteCarloNode())
+    return dict([(action, (child.visits, child.totalValue)) for action, child in root.children.items()]), root.visits
+
+class MonteCarloNode:
+    """
+      The statistics of one of Pacman's decision points in an open-loop UCT
+      tree.  Children are keyed by Pacman's action alone; the ghosts' moves
+      in between are sampled afresh each time the edge is followed.
+    """
+    __slots__ = ('children', 'visits', 'totalValue')
+
+    def __init__(self):
+        self.children = {}
+        self.visits = 0
+        self.totalValue = 0.0
+
+class MonteCarloAgent(MultiAgentSearchAgent):
+    """
+      A Monte Carlo tree search (UCT) agent.  Each iteration walks down the
+      tree choosing Pacman's moves by UCB1 and the ghosts' moves from
+      ghostModel (a ghostAgents class), adds one node, and then plays a fast
+      rollout of rolloutDepth rounds in which Pacman wanders without
+      reversing and the ghosts follow ghostModel.  The evaluation function
+      scores the state the rollout ends in.
+
+      Each move runs for timeBudget seconds if one is given, and otherwise
+      for a fixed number of iterations.  The subtree under the action taken
+      is kept for the next move.  With workers=N, N independent trees are
+      grown in worker processes and their root statistics added up (root
+      parallelism); these trees are not kept.
+
+      > python pacman.py -p MonteCarloAgent -a timeBudget=0.05 -l mediumClassic
+    """
+
+    def __init__(self, evalFn = 'scoreEvaluationFunction', depth = '2', iterations = '100',
+                 rolloutDepth = '5', exploration = '1.0', ghostModel = 'RandomGhost', seed = '0', **args):
+        MultiAgentSearchAgent.__init__(self, evalFn, depth, **args)
+        self.iterations = int(iterations)
+        self.rolloutDepth = int(rolloutDepth)
+        self.exploration = float(exploration)
+        self.ghostModel = ghostModel
+        self.ghostModels = {}
+        self.random = random.Random(int(seed)) # Keeps search off the game's random stream
+        self.root = None
+        self.expectedPosition = None
+        self.valueRange = [float('inf'), float('-inf')] # Rollout values seen, to normalize UCB1
+
+    def registerInitialState(self, gameState):
+        MultiAgentSearchAgent.registerInitialState(self, gameState)
+        self.root = None
+        self.valueRange = [float('inf'), float('-inf')]
+
+    def getAction(self, gameState):
+        """
+          Returns the most visited action at the root after the search.
+        """
+        if self.workers > 1:
+            return self.parallelAction(gameState)
+
+        # Reuse the subtree of the last action if Pacman got where it led
+        root = self.root
+        if root is None or gameState.getPacmanPosition() != self.expectedPosition:
+            root = MonteCarloNode()
+        root = self.growTree(gameState, root)
+
+        action = self.bestAction(gameState, dict([(a, (child.visits, child.totalValue))
+                                                  for a, child in root.children.items()]))
+        self.root = root.children.get(action)
+        self.expectedPosition = Actions.getSuccessor(gameState.getPacmanPosition(), action)
+        return action
+
+    def parallelAction(self, gameState):
+        pool = self.getPool()
+        futures = [pool.submit(_searchMonteCarlo, self, gameState, self.random.getrandbits(32))
+                   for i in range(self.workers)]
+        totals = {}
+        for future in futures:
+            statistics, iterations = future.result()
+            self.nodesExpanded += iterations
+            for action, (visits, totalValue) in statistics.items():
+                oldVisits, oldValue = totals.get(action, (0, 0.0))
+                totals[action] = (oldVisits + visits, oldValue + totalValue)
+        return self.bestAction(gameState, totals)
+
+    def bestAction(self, gameState, statistics):
+        """
+          Returns the most visited action, breaking ties by mean value.
+          statistics maps actions to (visits, totalValue).
+        """
+        def key(action):
+            visits, totalValue = statistics.get(action, (0, 0.0))
+            if visits == 0: return (0, float('-inf'))
+            return (visits, totalValue / visits)
+        return max(gameState.getLegalActions(0), key = key)
+
+    def growTree(self, gameState, root):
+        """
+          Runs the search iterations from gameState and returns root.
+        """
+        if self.timeBudget:
+            deadline = self.moveDeadline()
+            while True:
+                self.iterate(gameState, root)
+                if time.perf_counter() > deadline: break
+        else:
+            for i in range(self.iterations):
+                self.iterate(gameState, root)
+        return root
+
+    def iterate(self, gameState, root):
+        """
+          One selection, expansion, rollout and backup.
+        """
+        self.nodesExpanded += 1
+        path, node, state = [root], root, gameState
+        while not (state.isWin() or state.isLose()):
+            actions = state.getLegalActions(0)
+            untried = [action for action in actions if action not in node.children]
+            if untried:
+                # Standing still is rarely best, so try it last
+                moves = [action for action in untried if action != Directions.STOP]
+                action = self.random.choice(moves or untried)
+                node.children[action] = MonteCarloNode()
+                node = node.children[action]
+                path.append(node)
+                state = self.playRound(state, action)
+                break
+            action = self.selectAction(node, actions)
+            node = node.children[action]
+            path.append(node)
+            state = self.playRound(state, action)
+
+        value = self.rollout(state)
+        low, high = self.valueRange
+        self.valueRange = [min(low, value), max(high, value)]
+        for node in path:
+            node.visits += 1
+            node.totalValue += value
+
+    def selectAction(self, node, actions):
+        """
+          Returns the UCB1 choice among actions, all of which have children.
+        """
+        import math
+        low, high = self.valueRange
+        scale = high - low
+        if scale <= 0: scale = 1.0
+        logVisits = math.log(node.visits)
+        bestScore, bestAction = float('-inf'), None
+        for action in actions:
+            child = node.children[action]
+            mean = (child.totalValue / child.visits - low) / scale
+            score = mean + self.exploration * math.sqrt(logVisits / child.visits)
+            if score > bestScore:
+                bestScore, bestAction = score, action
+        return bestAction
+
+    def playRound(self, state, action):
+        """
+          Applies Pacman's action and then one sampled move for each ghost.
+        """
+        state = state.generateSuccessor(0, action)
+        for ghostIndex in range(1, state.getNumAgents()):
+            if state.isWin() or state.isLose(): break
+            state = state.generateSuccessor(ghostIndex, self.ghostAction(state, ghostIndex))
+        return state
+
+    def ghostAction(self, state, ghostIndex):
+        if self.ghostModel == 'RandomGhost':
+            return self.random.choice(state.getLegalActions(ghostIndex))
+        if ghostIndex not in self.ghostModels:
+            import ghostAgents
+            self.ghostModels[ghostIndex] = getattr(ghostAgents, self.ghostModel)(ghostIndex)
+        distribution = self.ghostModels[ghostIndex].getDistribution(state)
+        choice, cumulative = self.random.random(), 0.0
+        for action, probability in distribution.items():
+            cumulative += probability
+            if choice < cumulative: return action
+        return action
+
+    def rollout(self, state):
+        """
+          Plays up to rolloutDepth rounds with the default policies and
+          returns the evaluation of the state reached.
+        """
+        for i in range(self.rolloutDepth):
+            if state.isWin() or state.isLose(): break
+            actions = state.getLegalActions(0)
+            if len(actions) > 1:
+                actions = [action for action in actions if action != Directions.STOP]
+            reverse = Directions.REVERSE[state.getPacmanState().configuration.direction]
+            if reverse in actions and len(actions) > 1:
+                actions.remove(reverse)
+            # Eat adjacent food when there is some
+            food, position = state.getFood(), state.getPacmanPosition()
+            eating = [action for action in actions if food[int(position[0] + Actions._directions[action][0])][int(position[1] + Actions._directions[action][1])]]
+            state = self.playRound(state, self.random.choice(eating or actions))
+        return self.evaluationFunction(state)
 
 def betterEvaluationFunction(currentGameState):
     """
       Your extreme ghost-hunting, pellet-nabbing, food-gobbling, unstoppable
       evaluation function (question 5).
 
-      DESCRIPTION: <write something here so we know what you did>
+      DESCRIPTION: the game score, less 4 per food and 20 per capsule left
+      and 1.5 per step of maze distance to the nearest food.  A scared ghost
+      Pacman can reach before it recovers is worth 100 less 2 per step
+      away; any other ghost within one step costs 100.  States are scored in
+      batches (betterEvaluationBatch) so siblings share the food distances.
     """
-    "*** YOUR CODE HERE ***"
-    util.raiseNotDefined()
+    return betterEvaluationBatch([currentGameState])[0]
+
+def betterEvaluationBatch(gameStates):
+    values = []
+    for score, numFood, foodDistance, numCapsules, ghosts in leafFeatures(gameStates):
+        value = score - 4 * numFood - 20 * numCapsules
+        if foodDistance is not None:
+            value -= 1.5 * foodDistance
+        for distance, scaredTimer in ghosts:
+            if distance is None: continue
+            if scaredTimer > distance:
+                value += 100 - 2 * distance
+            elif distance <= 1:
+                value -= 100
+        values.append(value)
+    return values
+betterEvaluationFunction.batch = betterEvaluationBatch
 
 # Abbreviation
 better = betterEvaluationFunction
@@ -129,13 +129,13 @@ def parseTreeProblem(testDict):
 
 
 
-def run(lay, layName, pac, ghosts, disp, nGames=1, name='games'):
+def run(lay, layName, pac, ghosts, disp, nGames=1, name='games', workers=1):
     """
-    Runs a few games and outputs their statistics.
+    Runs a few games, in worker processes if workers > 1, and outputs their statistics.
     """
     starttime = time.time()
     print('*** Running %s on' % name, layName, '%d time(s).' % nGames)
-    games = pacman.runGames(lay, pac, ghosts, disp, nGames, False, catchExceptions=True, timeout=120)
+    games = pacman.runGames(lay, pac, ghosts, disp, nGames, False, catchExceptions=True, timeout=120, workers=workers)
     print('*** Finished running %s on' % name, layName, 'after %d seconds.' % (time.time() - starttime))
     stats = {'time': time.time() - starttime, 'wins': [g.state.isWin() for g in games].count(True), 'games': games, 'scores': [g.state.getScore() for g in games],
              'timeouts': [g.agentTimeout for g in games].count(True), 'crashes': [g.agentCrashed for g in games].count(True)}
@@ -166,8 +166,9 @@ class GradingAgent(Agent):
         random.seed(self.seed)
 
     def getAction(self, state):
-        GameState.getAndResetExplored()
+        GameState.setExploredTracking(True)
         studentAction = (self.studentAgent.getAction(state), len(GameState.getAndResetExplored()))
+        GameState.setExploredTracking(False)
         optimalActions = self.optimalActions[self.stepCount]
         altDepthActions = self.altDepthActions[self.stepCount]
         partialPlyBugActions = self.partialPlyBugActions[self.stepCount]
@@ -268,10 +269,11 @@ class PolyAgent(Agent):
 
     def getAction(self, state):
         # survey agents
-        GameState.getAndResetExplored()
+        GameState.setExploredTracking(True)
         optimalActionLists = []
         for agent in self.solutionAgents:
             optimalActionLists.append((agent.getBestPacmanActions(state)[0], len(GameState.getAndResetExplored())))
+        GameState.setExploredTracking(False)
         alternativeDepthLists = [agent.getBestPacmanActions(state)[0] for agent in self.alternativeDepthAgents]
         partialPlyBugLists = [agent.getBestPacmanActions(state)[0] for agent in self.partialPlyBugAgents]
         # record responses
@@ -437,6 +439,7 @@ class EvalAgentTest(testClasses.TestCase):
         self.maxTime = int(testDict['maxTime'])
         self.seed = int(testDict['randomSeed'])
         self.numGames = int(testDict['numGames'])
+        self.workers = int(testDict.get('workers', '1'))
 
         self.scoreMinimum = int(testDict['scoreMinimum']) if 'scoreMinimum' in testDict else None
         self.nonTimeoutMinimum = int(testDict['nonTimeoutMinimum']) if 'nonTimeoutMinimum' in testDict else None
@@ -462,7 +465,8 @@ class EvalAgentTest(testClasses.TestCase):
         disp = self.question.getDisplay()
 
         random.seed(self.seed)
-        games = pacman.runGames(lay, agent, self.ghosts, disp, self.numGames, False, catchExceptions=True, timeout=self.maxTime)
+        games = pacman.runGames(lay, agent, self.ghosts, disp, self.numGames, False, catchExceptions=True, timeout=self.maxTime,
+                                workers=self.workers)
         totalTime = time.time() - startTime
 
         stats = {'time': totalTime, 'wins': [g.state.isWin() for g in games].count(True),
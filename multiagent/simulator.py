@@ -0,0 +1,244 @@
+# simulator.py
+# ------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+simulator.py holds PacmanSimulator, a mutable stand-in for GameState meant
+for playouts.  GameState.generateSuccessor builds a new state for every ply;
+the simulator instead changes a handful of lists and ints in place, and can
+undo its moves.  It follows PacmanRules and GhostRules in pacman.py exactly
+(test_simulator.py checks this), so a playout scores the same either way.
+
+Positions are stored doubled, so that scared ghosts, which move half a
+square at a time, stay on integers.  Food and capsules are bitboards indexed
+like BitGrid (bit x * height + y), and legal moves come from the layout's
+LegalMoves.
+"""
+
+from game import Directions, Actions, BitGrid, _popcount
+from pacman import SCARED_TIME, TIME_PENALTY
+
+_STEPS = dict([(direction, (int(dx), int(dy))) for direction, (dx, dy) in Actions._directionsAsList])
+
+class PacmanSimulator:
+    """
+    A classic Pacman game held in mutable lists and ints.  Build it from a
+    layout, or from a layout and then loadState(gameState) to continue an
+    existing game.  step() plays a move in place; makeMove() does the same but
+    remembers how to undo it with unmakeMove().
+    """
+
+    def __init__(self, layout, numGhostAgents=None):
+        if numGhostAgents is None: numGhostAgents = layout.getNumGhosts()
+        self.layout = layout
+        self.height = layout.height
+        self.pacmanMoves, self.ghostMoves = layout.legalMoves.actions, layout.legalMoves.ghostActions
+        self.history = []
+
+        positions = []
+        numGhosts = 0
+        for isPacman, position in layout.agentPositions:
+            if not isPacman:
+                if numGhosts == numGhostAgents: continue
+                numGhosts += 1
+            positions.append(position)
+        self.numAgents = len(positions)
+        self.starts = [(2 * x, 2 * y) for x, y in positions]
+        self.x2 = [x for x, y in self.starts]
+        self.y2 = [y for x, y in self.starts]
+        self.direction = [Directions.STOP] * self.numAgents
+        self.scared = [0] * self.numAgents
+
+        self.food = layout.food.toBitGrid().bits
+        self.numFood = _popcount(self.food)
+        self.capsules = 0
+        for x, y in layout.capsules:
+            self.capsules |= 1 << (x * self.height + y)
+        self.score = 0
+        self.win = False
+        self.lose = False
+
+    def loadState(self, gameState):
+        """
+        Copies a GameState played on this simulator's layout.
+        """
+        data = gameState.data
+        self.numAgents = len(data.agentStates)
+        self.starts, self.x2, self.y2, self.direction, self.scared = [], [], [], [], []
+        for agentState in data.agentStates:
+            x, y = agentState.start.pos
+            self.starts.append((int(2 * x), int(2 * y)))
+            x, y = agentState.configuration.pos
+            self.x2.append(int(round(2 * x)))
+            self.y2.append(int(round(2 * y)))
+            self.direction.append(agentState.configuration.direction)
+            self.scared.append(agentState.scaredTimer)
+        food = data.food
+        if not isinstance(food, BitGrid): food = BitGrid.fromGrid(food)
+        self.food = food.bits
+        self.numFood = _popcount(self.food)
+        self.capsules = 0
+        for x, y in data.capsules:
+            self.capsules |= 1 << (x * self.height + y)
+        self.score = data.score
+        self.win = data._win
+        self.lose = data._lose
+        self.history = []
+
+    def getNumAgents(self):
+        return self.numAgents
+
+    def isWin(self):
+        return self.win
+
+    def isLose(self):
+        return self.lose
+
+    def getScore(self):
+        return self.score
+
+    def getNumFood(self):
+        return self.numFood
+
+    def hasFood(self, x, y):
+        return (self.food >> (x * self.height + y)) & 1 == 1
+
+    def getAgentPosition(self, agentIndex):
+        return (self.x2[agentIndex] / 2.0, self.y2[agentIndex] / 2.0)
+
+    def getPacmanPosition(self):
+        return (self.x2[0] // 2, self.y2[0] // 2)
+
+    def getLegalActions(self, agentIndex=0):
+        """
+        Returns the agent's legal actions, in the order GameState gives them.
+        """
+        if self.win or self.lose: return ()
+        x2, y2 = self.x2[agentIndex], self.y2[agentIndex]
+        if agentIndex == 0:
+            return self.pacmanMoves[(x2 >> 1) * self.height + (y2 >> 1)]
+        if (x2 | y2) & 1:
+            # Between squares ghosts keep going
+            return (self.direction[agentIndex],)
+        return self.ghostMoves[(x2 >> 1) * self.height + (y2 >> 1)][self.direction[agentIndex]]
+
+    def step(self, agentIndex, action):
+        """
+        Plays the agent's action in place, as GameState.generateSuccessor would.
+        """
+        if self.win or self.lose: raise Exception('Can\'t generate a successor of a terminal state.')
+        if action not in self.getLegalActions(agentIndex):
+            raise Exception('Illegal action ' + str(action))
+        if agentIndex == 0:
+            self._movePacman(action)
+        else:
+            self._moveGhost(agentIndex, action)
+
+    def makeMove(self, agentIndex, action):
+        """
+        Plays the agent's action in place, remembering how to undo it.
+        """
+        self.history.append((self.x2[:], self.y2[:], self.direction[:], self.scared[:], self.food,
+                             self.numFood, self.capsules, self.score, self.win, self.lose))
+        try:
+            self.step(agentIndex, action)
+        except Exception:
+            self.history.pop()
+            raise
+
+    def unmakeMove(self):
+        """
+        Undoes the last makeMove.
+        """
+        (self.x2, self.y2, self.direction, self.scared, self.food,
+         self.numFood, self.capsules, self.score, self.win, self.lose) = self.history.pop()
+
+    def playout(self, random, maxPlies, agentIndex=0):
+        """
+        Plays uniformly random legal moves, starting with agentIndex, until the
+        game ends or maxPlies moves have been made, and returns the number of
+        moves made.
+        """
+        plies = 0
+        numAgents = self.numAgents
+        while plies < maxPlies and not (self.win or self.lose):
+            legal = self.getLegalActions(agentIndex)
+            if not legal: break
+            if agentIndex == 0:
+                self._movePacman(random.choice(legal))
+            else:
+                self._moveGhost(agentIndex, random.choice(legal))
+            agentIndex += 1
+            if agentIndex == numAgents: agentIndex = 0
+            plies += 1
+        return plies
+
+    def _movePacman(self, action):
+        # PacmanRules.applyAction and consume, the time penalty and checkDeath
+        dx, dy = _STEPS[action]
+        x2 = self.x2[0] + dx + dx
+        y2 = self.y2[0] + dy + dy
+        self.x2[0], self.y2[0] = x2, y2
+        if action != Directions.STOP: self.direction[0] = action
+        score = self.score - TIME_PENALTY
+
+        bit = 1 << ((x2 >> 1) * self.height + (y2 >> 1))
+        if self.food & bit:
+            self.food ^= bit
+            self.numFood -= 1
+            score += 10
+            if self.numFood == 0 and not self.lose:
+                score += 500
+                self.win = True
+        if self.capsules & bit:
+            self.capsules ^= bit
+            scared = self.scared
+            for index in range(1, self.numAgents):
+                scared[index] = SCARED_TIME
+
+        ghostsX, ghostsY = self.x2, self.y2
+        for index in range(1, self.numAgents):
+            if abs(ghostsX[index] - x2) + abs(ghostsY[index] - y2) <= 1:
+                score = self._collide(index, score)
+        self.score = score
+
+    def _moveGhost(self, index, action):
+        # GhostRules.applyAction, decrementTimer and checkDeath
+        dx, dy = _STEPS[action]
+        timer = self.scared[index]
+        if timer == 0:
+            dx, dy = dx + dx, dy + dy
+        x2 = self.x2[index] + dx
+        y2 = self.y2[index] + dy
+        self.direction[index] = action
+        if timer == 1:
+            x2 = ((x2 + 1) >> 1) << 1
+            y2 = ((y2 + 1) >> 1) << 1
+        if timer > 0:
+            self.scared[index] = timer - 1
+        self.x2[index], self.y2[index] = x2, y2
+
+        if abs(self.x2[0] - x2) + abs(self.y2[0] - y2) <= 1:
+            self.score = self._collide(index, self.score)
+
+    def _collide(self, index, score):
+        # GhostRules.collide; collisions are within COLLISION_TOLERANCE, 1.4 half squares
+        if self.scared[index] > 0:
+            score += 200
+            self.x2[index], self.y2[index] = self.starts[index]
+            self.direction[index] = Directions.STOP
+            self.scared[index] = 0
+        elif not self.win:
+            score -= 500
+            self.lose = True
+        return score
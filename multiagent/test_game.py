@@ -0,0 +1,333 @@
+import io
+import pickle
+import random
+import sys
+import time
+import unittest
+from game import Grid, BitGrid, reconstituteGrid, Actions, Configuration, Directions
+from benchmark import loopPackBits, loopUnpackBits
+
+def randomGrid(width, height, density=0.4, seed=0):
+    rng = random.Random(seed)
+    grid = Grid(width, height)
+    for x in range(width):
+        for y in range(height):
+            grid[x][y] = rng.random() < density
+    return grid
+
+class TestGridSerialization(unittest.TestCase):
+    SIZES = [(1, 1), (3, 10), (20, 7), (28, 27), (5, 6), (30, 1)]
+
+    def test_pack_bits_round_trip(self):
+        for seed, (width, height) in enumerate(self.SIZES):
+            grid = randomGrid(width, height, seed=seed)
+            packed = grid.packBits()
+            self.assertEqual(packed, loopPackBits(grid))
+            self.assertEqual(reconstituteGrid(packed), grid)
+            self.assertEqual(loopUnpackBits(packed), grid)
+            self.assertEqual(grid.toBitGrid().packBits(), packed)
+            self.assertEqual(BitGrid(width, height, bitRepresentation=packed[2:]), grid)
+
+    def test_bytes_round_trip(self):
+        for seed, (width, height) in enumerate(self.SIZES):
+            grid = randomGrid(width, height, seed=seed)
+            data = grid.toBytes()
+            self.assertEqual(len(data), 4 + (width * height + 7) // 8)
+            self.assertEqual(Grid.fromBytes(data), grid)
+            self.assertEqual(grid.toBitGrid().toBytes(), data)
+            self.assertEqual(BitGrid.fromBytes(data), grid)
+            self.assertEqual(reconstituteGrid(data), grid)
+            self.assertTrue(isinstance(reconstituteGrid(data), BitGrid))
+            self.assertTrue(type(Grid.fromBytes(data)) is Grid)
+
+    def test_bytes_wrong_length(self):
+        data = randomGrid(8, 8).toBytes()
+        self.assertRaises(ValueError, Grid.fromBytes, data[:-1])
+
+    def test_pickle_round_trip(self):
+        grid = randomGrid(20, 11)
+        self.assertEqual(pickle.loads(pickle.dumps(grid)), grid)
+        self.assertEqual(pickle.loads(pickle.dumps(grid.toBitGrid())), grid)
+
+class TestZobristHash(unittest.TestCase):
+
+    def test_incremental_hash_matches_recomputed(self):
+        import layout
+        from pacman import GameState
+        rng = random.Random(0)
+        for name in ['mediumClassic', 'trickyClassic']:
+            lay = layout.getLayout(name)
+            start = GameState()
+            start.initialize(lay, lay.getNumGhosts())
+            history = []
+            for game in range(10):
+                state, agentIndex = start, 0
+                while not (state.isWin() or state.isLose()) and len(history) < 300 * (game + 1):
+                    successors = [state.generateSuccessor(agentIndex, action)
+                                  for action in state.getLegalActions(agentIndex)]
+                    for successor in successors:
+                        self.assertEqual(successor.data.zobristHash(), successor.data._computeZobrist())
+                    state = rng.choice(successors)
+                    agentIndex = (agentIndex + 1) % state.getNumAgents()
+                    history.append(state)
+            # Generating successors must not have changed their predecessors
+            for state in history:
+                self.assertEqual(state.data.zobristHash(), state.data._computeZobrist())
+                self.assertEqual(hash(state), hash(state.deepCopy()))
+
+class TestLegalMoves(unittest.TestCase):
+
+    def test_tables_match_wall_lookups(self):
+        import layout
+        for layoutName in ['mediumClassic', 'trickyClassic', 'openClassic']:
+            lay = layout.getLayout(layoutName)
+            walls = lay.walls
+            plainWalls = walls.copy()
+            self.assertTrue(walls.legalMoves is lay.legalMoves)
+            self.assertTrue(plainWalls.legalMoves is None)
+            for x in range(1, walls.width - 1):
+                for y in range(1, walls.height - 1):
+                    self.assertEqual(Actions.getLegalNeighbors((x, y), walls),
+                                     Actions.getLegalNeighbors((x, y), plainWalls))
+                    for direction in Directions.REVERSE:
+                        for dx, dy in [(0, 0), (0.5, 0), (0, 0.5), (-0.5, 0), (0, -0.5)]:
+                            config = Configuration((x + dx, y + dy), direction)
+                            possible = Actions.getPossibleActions(config, plainWalls)
+                            self.assertEqual(Actions.getPossibleActions(config, walls), possible)
+                            ghostActions = [action for action in possible if action != Directions.STOP]
+                            reverse = Actions.reverseDirection(direction)
+                            if reverse in ghostActions and len(ghostActions) > 1:
+                                ghostActions.remove(reverse)
+                            self.assertEqual(list(lay.legalMoves.getGhostActions(config)), ghostActions)
+
+    def test_grids_without_tables(self):
+        import layout
+        lay = layout.getLayout('mediumClassic')
+        oldPickle = lay.walls.copy()
+        del oldPickle.legalMoves
+        for walls in [lay.walls.toBitGrid(), oldPickle]:
+            for x in range(1, lay.width - 1):
+                for y in range(1, lay.height - 1):
+                    config = Configuration((x, y), Directions.STOP)
+                    self.assertEqual(Actions.getPossibleActions(config, walls),
+                                     list(lay.legalMoves.getPossibleActions(config)))
+                    self.assertEqual(Actions.getLegalNeighbors((x, y), walls),
+                                     list(lay.legalMoves.getLegalNeighbors((x, y))))
+
+    def test_food_distances_follow_eaten_food(self):
+        import layout
+        from pacman import GameState
+        rng = random.Random(3)
+        for layoutName in ['mediumClassic', 'trickyClassic', 'openClassic']:
+            lay = layout.getLayout(layoutName)
+            lay.legalMoves.foodFields.clear()
+            state, agentIndex = GameState(), 0
+            state.initialize(lay, lay.getNumGhosts())
+            while not (state.isWin() or state.isLose()):
+                state = state.generateSuccessor(agentIndex, rng.choice(state.getLegalActions(agentIndex)))
+                agentIndex = (agentIndex + 1) % state.getNumAgents()
+                field = lay.legalMoves.getDistanceField(state.getFood().asList())
+                self.assertEqual(state.data.foodDistances(), field)
+                x, y = state.getPacmanPosition()
+                self.assertEqual(state.getFoodDistance(), field[x * lay.height + y])
+
+    def test_maze_distances(self):
+        import layout
+        from pacman import GameState
+        lay = layout.getLayout('smallClassic')
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        cells = lay.walls.asList(False)
+        for source in cells[::7]:
+            for target in cells[::5]:
+                self.assertEqual(state.getMazeDistance(source, target), state.getMazeDistance(target, source))
+            for neighbor in Actions.getLegalNeighbors(source, lay.walls):
+                self.assertTrue(state.getMazeDistance(source, neighbor) <= 1)
+        self.assertEqual(state.getCapsuleDistance(lay.capsules[0]), 0)
+
+    def test_shared_by_layout_text(self):
+        import layout, pickle
+        text = layout.getLayout('smallClassic').layoutText
+        first, second = layout.Layout(text[:]), layout.Layout(text[:])
+        self.assertTrue(first.legalMoves is second.legalMoves)
+        copied = pickle.loads(pickle.dumps(first))
+        self.assertTrue(copied.legalMoves is first.legalMoves)
+        self.assertTrue(copied.walls.legalMoves is first.legalMoves)
+
+class TestLayoutRegistry(unittest.TestCase):
+
+    def test_layouts_are_interned(self):
+        import layout, pickle
+        from pacman import GameState
+        lay = layout.getLayout('mediumClassic')
+        self.assertTrue(layout.getLayout('mediumClassic') is lay)
+        self.assertTrue(layout.internLayout(lay.layoutText[:]) is lay)
+        self.assertTrue(pickle.loads(pickle.dumps(lay)) is lay)
+        self.assertTrue(lay.deepCopy() is lay)
+
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        copied = state.deepCopy()
+        self.assertTrue(copied.data.layout is lay)
+        x, y = lay.food.asList()[0]
+        copied.data.food[x][y] = False
+        self.assertTrue(lay.food[x][y])
+        self.assertTrue(state.data.food[x][y])
+
+class TestHeadlessGame(unittest.TestCase):
+
+    def test_headless_plays_the_same_games(self):
+        import layout, pacmanAgents, ghostAgents, textDisplay
+        from pacman import ClassicGameRules
+        lay = layout.getLayout('smallClassic')
+        results = []
+        for headless in [False, True]:
+            random.seed(0)
+            rules = ClassicGameRules()
+            games = []
+            for i in range(5):
+                ghosts = [ghostAgents.DirectionalGhost(j + 1) for j in range(lay.getNumGhosts())]
+                game = rules.newGame(lay, pacmanAgents.GreedyAgent(), ghosts, textDisplay.NullGraphics(), True, False, headless)
+                game.run()
+                games.append((game.moveHistory, game.state.getScore(), game.state.isWin()))
+            results.append(games)
+        self.assertEqual(results[0], results[1])
+
+class TestParallelGames(unittest.TestCase):
+
+    def test_results_do_not_depend_on_workers(self):
+        import layout, multiAgents, ghostAgents
+        from pacman import runParallelGames
+        lay = layout.getLayout('smallClassic')
+        results = []
+        for workers in [2, 3]:
+            random.seed(0)
+            # The agent's own stream must not carry over between a worker's games
+            agent = multiAgents.MonteCarloAgent(iterations='10', rolloutDepth='3')
+            ghosts = [ghostAgents.RandomGhost(j + 1) for j in range(lay.getNumGhosts())]
+            games = dict(runParallelGames(lay, agent, ghosts, 5, workers=workers, headless=True))
+            results.append([games[i].moveHistory for i in range(5)])
+        self.assertEqual(results[0], results[1])
+
+class TestTimeoutFunction(unittest.TestCase):
+
+    def spin(self, seconds, check=False):
+        import util
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            if check: util.checkTime()
+        return 'done'
+
+    def inThread(self, function):
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(1) as pool:
+            return pool.submit(function).result()
+
+    # The budgets below are far from the work done under them, so that a
+    # loaded machine cannot change the outcome: a call either finishes well
+    # inside its budget or would run many times longer than it.
+
+    def test_interrupts_in_main_thread(self):
+        import util
+        self.assertEqual(util.TimeoutFunction(self.spin, 5)(0.01), 'done')
+        start = time.perf_counter()
+        self.assertRaises(util.TimeoutFunctionException, util.TimeoutFunction(self.spin, 0.2), 30)
+        self.assertLess(time.perf_counter() - start, 20)
+        self.assertTrue(util.getMoveBudget() is None)
+
+    def test_nested_calls_keep_the_outer_budget(self):
+        import util
+        def outer():
+            util.TimeoutFunction(self.spin, 5)(0.01)
+            return self.spin(30)
+        start = time.perf_counter()
+        self.assertRaises(util.TimeoutFunctionException, util.TimeoutFunction(outer, 0.2))
+        self.assertLess(time.perf_counter() - start, 20)
+
+    def test_cooperative_in_worker_thread(self):
+        import util
+        def timed(budget, seconds, check):
+            try:
+                return util.TimeoutFunction(self.spin, budget)(seconds, check)
+            except util.TimeoutFunctionException:
+                return 'timeout', time.perf_counter() - start
+        start = time.perf_counter()
+        result, elapsed = self.inThread(lambda: timed(0.2, 30, True))
+        self.assertEqual(result, 'timeout')
+        self.assertLess(elapsed, 20)
+        self.assertEqual(self.inThread(lambda: timed(0.05, 0.5, False))[0], 'timeout')
+        self.assertEqual(self.inThread(lambda: timed(5, 0.01, False)), 'done')
+
+    def test_game_reports_timeouts(self):
+        import layout, ghostAgents, textDisplay
+        from game import Agent
+        from pacman import ClassicGameRules
+        class SleepingAgent(Agent):
+            def getAction(self, state):
+                time.sleep(self.seconds)
+                return state.getLegalActions(0)[0]
+        lay = layout.getLayout('smallClassic')
+        def play(seconds):
+            agent = SleepingAgent()
+            agent.seconds = seconds
+            ghosts = [ghostAgents.RandomGhost(j + 1) for j in range(lay.getNumGhosts())]
+            game = ClassicGameRules(1).newGame(lay, agent, ghosts, textDisplay.NullGraphics(), True, True)
+            output = sys.stdout, sys.stderr
+            sys.stdout = sys.stderr = io.StringIO()
+            try:
+                game.run()
+            finally:
+                sys.stdout, sys.stderr = output
+            return game.agentTimeout, game.agentCrashed, len(game.moveHistory)
+        # Interrupted by the timer in the main thread, and found on return in a worker thread
+        self.assertEqual(play(30), (True, False, 0))
+        self.assertEqual(self.inThread(lambda: play(2)), (True, False, 0))
+
+    def withMoveBudget(self, budget, function):
+        import util
+        util._moveBudgets.budget = budget
+        try:
+            return function()
+        finally:
+            util._moveBudgets.budget = None
+
+    def test_timed_search_leaves_a_margin(self):
+        import util, multiAgents
+        agent = multiAgents.AlphaBetaAgent(timeBudget='1000')
+        for seconds in [0.1, 2.0]:
+            budget = util.MoveBudget(seconds)
+            margin = max(multiAgents.MOVE_BUDGET_MARGIN * seconds, multiAgents.MIN_MOVE_BUDGET_MARGIN)
+            self.assertEqual(self.withMoveBudget(budget, agent.moveDeadline), budget.deadline - margin)
+        agent = multiAgents.AlphaBetaAgent(timeBudget='0.5')
+        before = time.perf_counter()
+        deadline = self.withMoveBudget(util.MoveBudget(1000), agent.moveDeadline)
+        self.assertTrue(before + 0.5 <= deadline <= time.perf_counter() + 0.5)
+
+    def test_auto_time_budget_follows_the_game(self):
+        import util, multiAgents
+        agent = multiAgents.AlphaBetaAgent(timeBudget='auto')
+        for seconds in [0.3, 3.0]:
+            budget = util.MoveBudget(seconds)
+            margin = max(multiAgents.MOVE_BUDGET_MARGIN * seconds, multiAgents.MIN_MOVE_BUDGET_MARGIN)
+            self.assertEqual(self.withMoveBudget(budget, agent.moveDeadline), budget.deadline - margin)
+        before = time.perf_counter()
+        deadline = agent.moveDeadline()
+        self.assertTrue(before + multiAgents.DEFAULT_AUTO_TIME_BUDGET <= deadline
+                        <= time.perf_counter() + multiAgents.DEFAULT_AUTO_TIME_BUDGET)
+
+    def test_timed_search_stops_when_the_move_budget_is_spent(self):
+        import util, layout, multiAgents
+        from pacman import GameState
+        lay = layout.getLayout('smallClassic')
+        state = GameState()
+        state.initialize(lay, lay.getNumGhosts())
+        def search():
+            agent = multiAgents.AlphaBetaAgent(timeBudget='1000')
+            action = self.withMoveBudget(util.MoveBudget(0), lambda: agent.getAction(state))
+            return action, agent.depthsReached
+        for action, depthsReached in [search(), self.inThread(search)]:
+            self.assertTrue(action in state.getLegalActions(0))
+            self.assertEqual(depthsReached, [1])
+
+if __name__ == '__main__':
+    unittest.main()
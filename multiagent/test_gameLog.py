@@ -0,0 +1,85 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import gameLog
+import ghostAgents
+import layout
+import pacmanAgents
+import textDisplay
+from pacman import ClassicGameRules
+
+def playGames(layoutName, numGames, numGhosts=None):
+    lay = layout.getLayout(layoutName)
+    if numGhosts is None: numGhosts = lay.getNumGhosts()
+    rules = ClassicGameRules()
+    games = []
+    for i in range(numGames):
+        ghosts = [ghostAgents.DirectionalGhost(j + 1) for j in range(numGhosts)]
+        game = rules.newGame(lay, pacmanAgents.GreedyAgent(), ghosts, textDisplay.NullGraphics(), True, False, True)
+        game.run()
+        games.append(game)
+    return games
+
+class TestGameLog(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(0)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'games.pacmanlog')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertSameState(self, state, expected):
+        self.assertEqual(state.data, expected.data)
+        self.assertEqual(state.isWin(), expected.isWin())
+        self.assertEqual(state.isLose(), expected.isLose())
+        self.assertEqual(hash(state), hash(expected))
+
+    def test_round_trip(self):
+        games = playGames('mediumClassic', 3) + playGames('smallClassic', 2, numGhosts=1)
+        with gameLog.GameLogWriter(self.path, checkpointInterval=16) as log:
+            for number, game in enumerate(games[:3]):
+                log.writeGame(game, number)
+        # Appending refers to the layout already in the log
+        with gameLog.GameLogWriter(self.path, checkpointInterval=16) as log:
+            for number, game in enumerate(games[3:]):
+                log.writeGame(game, 3 + number)
+            log.writeGame(games[0], 5)
+
+        rng = random.Random(0)
+        with gameLog.GameLogReader(self.path) as reader:
+            self.assertEqual(len(reader.getLayoutHashes()), 2)
+            recorded = list(reader)
+            self.assertEqual([game.number for game in recorded], list(range(6)))
+            for game, expected in zip(recorded, games + games[:1]):
+                self.assertTrue(game.layout is expected.state.data.layout)
+                self.assertEqual(game.numAgents, expected.state.getNumAgents())
+                self.assertEqual(game.getActions(), expected.moveHistory)
+                self.assertSameState(game.getState(game.numMoves), expected.state)
+
+                states = list(game.replay())
+                self.assertEqual(len(states), game.numMoves + 1)
+                for move in [rng.randrange(game.numMoves + 1) for i in range(10)]:
+                    self.assertSameState(game.getState(move), states[move])
+                    self.assertEqual(game.getActions(move, move + 3), expected.moveHistory[move:move + 3])
+
+    def test_smaller_than_pickles(self):
+        import pickle
+        games = playGames('mediumClassic', 10)
+        with gameLog.GameLogWriter(self.path) as log:
+            for number, game in enumerate(games):
+                log.writeGame(game, number)
+        pickled = sum([len(pickle.dumps({'layout': layout.Layout(game.state.data.layout.layoutText),
+                                         'actions': game.moveHistory})) for game in games])
+        self.assertLess(os.path.getsize(self.path) * 5, pickled)
+
+    def test_rejects_other_files(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a game log')
+        self.assertRaises(Exception, gameLog.GameLogReader, self.path)
+
+if __name__ == '__main__':
+    unittest.main()
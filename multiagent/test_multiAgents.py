@@ -0,0 +1,125 @@
+import random
+import unittest
+import layout
+import multiAgents
+from pacman import GameState
+
+def randomStates(layoutName, count, seed=0):
+    rng = random.Random(seed)
+    lay = layout.getLayout(layoutName)
+    start = GameState()
+    start.initialize(lay, lay.getNumGhosts())
+    states, state, agentIndex = [], start, 0
+    while len(states) < count:
+        if state.isWin() or state.isLose():
+            state, agentIndex = start, 0
+        state = state.generateSuccessor(agentIndex, rng.choice(state.getLegalActions(agentIndex)))
+        agentIndex = (agentIndex + 1) % state.getNumAgents()
+        states.append(state)
+    return states
+
+def betterOneByOne(gameState):
+    return multiAgents.betterEvaluationBatch([gameState])[0]
+
+def mazeDistances(walls, start):
+    # Breadth-first search over the walls, independent of LegalMoves
+    distances, frontier = {start: 0}, [start]
+    for position in frontier:
+        x, y = position
+        for neighbor in [(x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)]:
+            if neighbor not in distances and not walls[neighbor[0]][neighbor[1]]:
+                distances[neighbor] = distances[position] + 1
+                frontier.append(neighbor)
+    return distances
+
+def betterByHand(gameState):
+    # betterEvaluationFunction's DESCRIPTION, worked out with a plain search
+    x, y = gameState.getPacmanPosition()
+    distances = mazeDistances(gameState.getWalls(), (int(x), int(y)))
+    value = gameState.getScore() - 4 * gameState.getNumFood() - 20 * len(gameState.getCapsules())
+    foodDistances = [distances[food] for food in gameState.getFood().asList() if food in distances]
+    if foodDistances:
+        value -= 1.5 * min(foodDistances)
+    for ghostState in gameState.getGhostStates():
+        gx, gy = ghostState.getPosition()
+        distance = distances.get((int(gx + 0.5), int(gy + 0.5)))
+        if distance is None: continue
+        if ghostState.scaredTimer > distance:
+            value += 100 - 2 * distance
+        elif distance <= 1:
+            value -= 100
+    return value
+
+class TestBatchedEvaluation(unittest.TestCase):
+
+    def test_batch_matches_independent_evaluation(self):
+        for layoutName in ['mediumClassic', 'trickyClassic']:
+            states = randomStates(layoutName, 300)
+            rng = random.Random(1)
+            for state in states[:100]:
+                # Random play rarely reaches a capsule, so scare some ghosts here
+                scared = state.deepCopy()
+                for ghostState in scared.getGhostStates():
+                    ghostState.scaredTimer = rng.randint(1, 40)
+                states.append(scared)
+            self.assertEqual(multiAgents.betterEvaluationBatch(states),
+                             [betterByHand(state) for state in states])
+            self.assertEqual(multiAgents.scoreEvaluationBatch(states),
+                             [state.getScore() for state in states])
+
+    def test_search_agents_choose_the_same_actions(self):
+        states = randomStates('smallClassic', 40, seed=1)
+        states = [state for state in states if not (state.isWin() or state.isLose())]
+        for agentClass in [multiAgents.MinimaxAgent, multiAgents.ExpectimaxAgent]:
+            batched = agentClass(evalFn='betterEvaluationFunction', depth='2')
+            oneByOne = agentClass(evalFn='betterEvaluationFunction', depth='2')
+            oneByOne.evaluationFunction = betterOneByOne
+            for state in states:
+                self.assertEqual(batched.getAction(state), oneByOne.getAction(state))
+
+class TestAlphaBetaTable(unittest.TestCase):
+
+    def test_full_window_search_stores_exact_values(self):
+        states = randomStates('smallClassic', 20, seed=2)
+        states = [state for state in states if not (state.isWin() or state.isLose())]
+        agent = multiAgents.AlphaBetaAgent(depth='3', tableSize='100000')
+        exact = 0
+        for state in states:
+            agent.transpositionTable.clear()
+            agent.getAction(state)
+            # The root's first action is searched with the full window
+            first = agent.orderActions(state, 0, 0)[0]
+            entry = agent.transpositionTable.lookup(state.generateSuccessor(0, first), agent.depth, 1)
+            self.assertEqual(entry[1], agent.EXACT)
+            bounds = [bound for value, bound, action in agent.transpositionTable.entries.values()]
+            exact += bounds.count(agent.EXACT)
+        self.assertGreater(exact, len(states))
+
+    def test_table_does_not_change_actions(self):
+        states = randomStates('smallClassic', 40, seed=3)
+        states = [state for state in states if not (state.isWin() or state.isLose())]
+        plain = multiAgents.AlphaBetaAgent(depth='3')
+        cached = multiAgents.AlphaBetaAgent(depth='3', tableSize='100000')
+        for state in states:
+            self.assertEqual(plain.getAction(state), cached.getAction(state))
+
+class TestParallelSearch(unittest.TestCase):
+
+    def test_leaves_the_game_random_stream_alone(self):
+        states = randomStates('smallClassic', 6, seed=4)
+        states = [state for state in states if not (state.isWin() or state.isLose())]
+        serial = multiAgents.MinimaxAgent(depth='2')
+        parallel = multiAgents.MinimaxAgent(depth='2', workers='2', parallelPly='2')
+        try:
+            for state in states:
+                random.seed(5)
+                action = serial.getAction(state)
+                expected = random.random()
+                random.seed(5)
+                self.assertEqual(parallel.getAction(state), action)
+                self.assertEqual(random.random(), expected)
+        finally:
+            parallel.pool.shutdown()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+import random
+import unittest
+import layout
+from pacman import GameState
+from simulator import PacmanSimulator
+
+LAYOUTS = ['capsuleClassic', 'smallClassic', 'mediumClassic', 'trickyClassic', 'minimaxClassic', 'testClassic']
+
+def startState(lay):
+    state = GameState()
+    state.initialize(lay, lay.getNumGhosts())
+    return state
+
+class TestPacmanSimulator(unittest.TestCase):
+
+    def assertMatches(self, simulator, state):
+        self.assertEqual(simulator.isWin(), state.isWin())
+        self.assertEqual(simulator.isLose(), state.isLose())
+        self.assertEqual(simulator.getScore(), state.getScore())
+        self.assertEqual(simulator.getNumFood(), state.getNumFood())
+        self.assertEqual(simulator.food, state.getFood().bits)
+        capsules = [(x, y) for x, y in state.getCapsules()]
+        self.assertEqual(simulator.capsules, sum([1 << (x * simulator.height + y) for x, y in capsules]))
+        for index, agentState in enumerate(state.data.agentStates):
+            self.assertEqual(simulator.getAgentPosition(index), agentState.configuration.pos)
+            self.assertEqual(simulator.direction[index], agentState.configuration.direction)
+            self.assertEqual(simulator.scared[index], agentState.scaredTimer)
+            self.assertEqual(list(simulator.getLegalActions(index)), state.getLegalActions(index))
+
+    def test_matches_reference_rules(self):
+        rng = random.Random(0)
+        for layoutName in LAYOUTS:
+            lay = layout.getLayout(layoutName)
+            for game in range(20):
+                state = startState(lay)
+                simulator = PacmanSimulator(lay)
+                self.assertMatches(simulator, state)
+                agentIndex = 0
+                while not (state.isWin() or state.isLose()):
+                    action = rng.choice(state.getLegalActions(agentIndex))
+                    state = state.generateSuccessor(agentIndex, action)
+                    simulator.step(agentIndex, action)
+                    self.assertMatches(simulator, state)
+                    agentIndex = (agentIndex + 1) % state.getNumAgents()
+
+    def test_load_state(self):
+        rng = random.Random(1)
+        lay = layout.getLayout('mediumClassic')
+        state, agentIndex = startState(lay), 0
+        simulator = PacmanSimulator(lay)
+        for ply in range(200):
+            if state.isWin() or state.isLose(): break
+            state = state.generateSuccessor(agentIndex, rng.choice(state.getLegalActions(agentIndex)))
+            agentIndex = (agentIndex + 1) % state.getNumAgents()
+            simulator.loadState(state)
+            self.assertMatches(simulator, state)
+
+    def test_unmake_restores_start(self):
+        rng = random.Random(2)
+        lay = layout.getLayout('smallClassic')
+        state = startState(lay)
+        simulator = PacmanSimulator(lay)
+        moves, agentIndex = 0, 0
+        while not (simulator.isWin() or simulator.isLose()):
+            simulator.makeMove(agentIndex, rng.choice(simulator.getLegalActions(agentIndex)))
+            agentIndex = (agentIndex + 1) % simulator.getNumAgents()
+            moves += 1
+        for _ in range(moves):
+            simulator.unmakeMove()
+        self.assertMatches(simulator, state)
+
+    def test_illegal_moves_raise(self):
+        lay = layout.getLayout('smallClassic')
+        simulator = PacmanSimulator(lay)
+        illegal = [action for action in ['North', 'South', 'East', 'West']
+                   if action not in simulator.getLegalActions(0)]
+        self.assertRaises(Exception, simulator.makeMove, 0, illegal[0])
+        self.assertEqual(simulator.history, [])
+
+if __name__ == '__main__':
+    unittest.main()
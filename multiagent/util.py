@@ -573,6 +573,93 @@ def lookup(name, namespace):
         if len(options) > 1: raise Exception('Name conflict for %s' % name)
         raise Exception('%s not found as a method or class' % name)
 
+class TranspositionTable:
+    """
+      A bounded cache of search results keyed by (hash(state), depth,
+      agentIndex), where depth is the search depth remaining below the state.
+      Because the key holds the remaining depth rather than the distance from
+      the root, entries stay valid from one move to the next.  Only the hash
+      of the state is kept, so the table does not keep states alive; game
+      states have 64 bit hashes, which makes collisions vanishingly rare.
+
+      Two replacement policies are available once the table is full:
+
+        'lru'    evicts the least recently used entry.
+        'depth'  hashes each key to one of size slots and keeps whichever
+                 entry searched deeper, since it saved the most work.
+
+      hits, misses, stores and evictions are counted so the size can be tuned.
+    """
+    def __init__(self, size=100000, replacement='lru'):
+        if size < 1: raise ValueError('A transposition table needs at least one entry')
+        if replacement not in ('lru', 'depth'):
+            raise ValueError('Unknown replacement policy: %s' % replacement)
+        self.size = size
+        self.replacement = replacement
+        self.clear()
+
+    def clear(self):
+        "Removes every entry and resets the counters"
+        from collections import OrderedDict
+        self.entries = OrderedDict() if self.replacement == 'lru' else {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(self, state, depth, agentIndex):
+        """
+          Returns the value stored for the state, or None if there is none.
+        """
+        key = (hash(state), depth, agentIndex)
+        if self.replacement == 'lru':
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        else:
+            entry = self.entries.get(hash(key) % self.size)
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+            value = entry[1]
+        self.hits += 1
+        return value
+
+    def store(self, state, depth, agentIndex, value):
+        """
+          Records the value of the state, evicting an entry if the table is full.
+        """
+        key = (hash(state), depth, agentIndex)
+        self.stores += 1
+        if self.replacement == 'lru':
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            slot = hash(key) % self.size
+            entry = self.entries.get(slot)
+            if entry is not None and entry[0] != key:
+                if entry[0][1] > depth: return
+                self.evictions += 1
+            self.entries[slot] = (key, value)
+
+    def hitRate(self):
+        "Returns the fraction of lookups that found an entry"
+        lookups = self.hits + self.misses
+        if lookups == 0: return 0.0
+        return self.hits / float(lookups)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return ('%d/%d entries, %d hits, %d misses (%.1f%% hit rate), %d evictions'
+                % (len(self), self.size, self.hits, self.misses, 100 * self.hitRate(), self.evictions))
+
 def pause():
     """
     Pauses the output stream awaiting user feedback.
@@ -590,13 +677,58 @@ def pause():
 # this have all student code so wrapped.
 #
 import signal
+import threading
 import time
 class TimeoutFunctionException(Exception):
     """Exception to raise on a timeout"""
     pass
 
 
+# The MoveBudget of the timed call running in each thread
+_moveBudgets = threading.local()
+
+class MoveBudget:
+    """
+    The time left for one timed call into an agent, on a monotonic clock.
+    TimeoutFunction makes one for each call; agents can find it with
+    getMoveBudget() and plan their search around it.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.perf_counter() + seconds
+
+    def timeLeft(self):
+        return self.deadline - time.perf_counter()
+
+    def expired(self):
+        return time.perf_counter() >= self.deadline
+
+def getMoveBudget():
+    """
+    Returns the MoveBudget of the timed call running in this thread, or None.
+    """
+    return getattr(_moveBudgets, 'budget', None)
+
+def checkTime():
+    """
+    Raises TimeoutFunctionException if the timed call running in this thread
+    is out of time.  Long computations outside the main thread should call
+    this now and then, since nothing can interrupt them there.
+    """
+    budget = getattr(_moveBudgets, 'budget', None)
+    if budget is not None and time.perf_counter() >= budget.deadline:
+        raise TimeoutFunctionException()
+
+
 class TimeoutFunction:
+    """
+    Wraps function so that calls to it take at most timeout seconds, which
+    need not be whole.  In the main thread an interval timer (SIGALRM)
+    interrupts calls that run over.  Other threads cannot take signals, so
+    there the budget is enforced through checkTime() and checked again when
+    the call returns.  Timed calls can nest; the inner one never gets more
+    time than the outer one has left.
+    """
     def __init__(self, function, timeout):
         self.timeout = timeout
         self.function = function
@@ -605,23 +737,26 @@ class TimeoutFunction:
         raise TimeoutFunctionException()
 
     def __call__(self, *args, **keyArgs):
-        # If we have SIGALRM signal, use it to cause an exception if and
-        # when this function runs too long.  Otherwise check the time taken
-        # after the method has returned, and throw an exception then.
-        if hasattr(signal, 'SIGALRM'):
+        outer = getMoveBudget()
+        budget = MoveBudget(self.timeout)
+        if outer is not None and outer.deadline < budget.deadline:
+            budget.deadline = outer.deadline
+        interrupt = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+        if interrupt:
             old = signal.signal(signal.SIGALRM, self.handle_timeout)
-            signal.alarm(self.timeout)
-            try:
-                result = self.function(*args, **keyArgs)
-            finally:
-                signal.signal(signal.SIGALRM, old)
-            signal.alarm(0)
-        else:
-            startTime = time.time()
+            signal.setitimer(signal.ITIMER_REAL, max(budget.timeLeft(), 1e-6))
+        _moveBudgets.budget = budget
+        try:
             result = self.function(*args, **keyArgs)
-            timeElapsed = time.time() - startTime
-            if timeElapsed >= self.timeout:
-                self.handle_timeout(None, None)
+        finally:
+            _moveBudgets.budget = outer
+            if interrupt:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, old)
+                if outer is not None:
+                    signal.setitimer(signal.ITIMER_REAL, max(outer.timeLeft(), 1e-6))
+        if budget.expired():
+            raise TimeoutFunctionException()
         return result
 
 
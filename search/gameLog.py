@@ -0,0 +1,288 @@
+# gameLog.py
+# ----------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+gameLog.py holds a compact binary format for recorded games.  A log is only
+ever appended to, and GameLogReader streams it back one game at a time.
+runGames(record=True) writes one.
+
+A log is MAGIC followed by records, each a tag byte, a 32-bit length and a
+body:
+
+  L  The SHA-1 of a layout's text, then the text.  It is written the first
+     time the log refers to the layout.
+  G  A game: its layout's SHA-1, its number, the number of agents and of
+     moves, the moves at 3 bits each, and then a checkpoint of the state
+     after every CHECKPOINT_INTERVAL moves.
+
+Agents move in turn starting with Pacman, so a move is stored as just its
+action.  A checkpoint holds each agent's position (doubled, since scared
+ghosts stop between squares), direction and scared timer, then the food as
+BitGrid bits, the remaining capsules as a mask over the layout's, the score
+and the win and lose flags.  Its size only depends on the layout and the
+number of agents, so the reader can go straight to the checkpoint before
+any move and replay the few moves after it.
+"""
+
+import hashlib
+import os
+import struct
+from game import Directions, Configuration
+from layout import internLayout
+from pacman import GameState
+
+MAGIC = b'PACLOG\x00\x01'
+CHECKPOINT_INTERVAL = 128
+
+ACTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+ACTION_CODES = dict([(action, code) for code, action in enumerate(ACTIONS)])
+
+_RECORD = struct.Struct('<cI')      # tag, length of the body
+_GAME = struct.Struct('<20sIBII')   # layout hash, number, agents, moves, checkpoint interval
+_AGENT = struct.Struct('<hhBH')     # doubled x and y, direction, scared timer
+_RESULT = struct.Struct('<dB')      # score, win (1) and lose (2) flags
+
+def layoutHash(layout):
+    return hashlib.sha1('\n'.join(layout.layoutText).encode('utf-8')).digest()
+
+def packActions(moveHistory, numAgents):
+    """
+    Packs the actions of moveHistory into 3 bytes for every 8 moves.
+    """
+    packed = bytearray()
+    for start in range(0, len(moveHistory), 8):
+        group = 0
+        for i, (agentIndex, action) in enumerate(moveHistory[start:start + 8]):
+            if agentIndex != (start + i) % numAgents:
+                raise Exception('Only games in which the agents move in turn can be logged')
+            group |= ACTION_CODES[action] << (3 * i)
+        packed += group.to_bytes(3, 'little')
+    return bytes(packed)
+
+def unpackActions(packed, start, stop, numAgents):
+    """
+    Returns moves start to stop as (agentIndex, action) pairs, from the
+    packed actions of the 3-byte groups starting with move start // 8 * 8.
+    """
+    moves = []
+    first = start - start % 8
+    for offset in range(0, len(packed), 3):
+        group = int.from_bytes(packed[offset:offset + 3], 'little')
+        for i in range(8):
+            move = first + offset // 3 * 8 + i
+            if move >= stop: return moves
+            if move >= start:
+                moves.append((move % numAgents, ACTIONS[(group >> (3 * i)) & 7]))
+    return moves
+
+def checkpointSize(layout, numAgents):
+    return (numAgents * _AGENT.size + (layout.width * layout.height + 7) // 8
+            + (len(layout.capsules) + 7) // 8 + _RESULT.size)
+
+def packCheckpoint(state):
+    data = state.data
+    layout = data.layout
+    packed = bytearray()
+    for agentState in data.agentStates:
+        x, y = agentState.configuration.pos
+        packed += _AGENT.pack(int(round(2 * x)), int(round(2 * y)),
+                              ACTION_CODES[agentState.configuration.direction], agentState.scaredTimer)
+    packed += data.food.bits.to_bytes((layout.width * layout.height + 7) // 8, 'little')
+    capsules = set([tuple(position) for position in data.capsules])
+    mask = sum([1 << i for i, position in enumerate(layout.capsules) if tuple(position) in capsules])
+    packed += mask.to_bytes((len(layout.capsules) + 7) // 8, 'little')
+    packed += _RESULT.pack(data.score, data._win | data._lose << 1)
+    return bytes(packed)
+
+def unpackCheckpoint(layout, numAgents, packed):
+    """
+    Returns the GameState saved by packCheckpoint.
+    """
+    state = startState(layout, numAgents)
+    data = state.data
+    offset = 0
+    for agentState in data.agentStates:
+        x2, y2, direction, scaredTimer = _AGENT.unpack_from(packed, offset)
+        agentState.configuration = Configuration((x2 / 2.0, y2 / 2.0), ACTIONS[direction])
+        agentState.scaredTimer = scaredTimer
+        offset += _AGENT.size
+    size = (layout.width * layout.height + 7) // 8
+    data.food.bits = int.from_bytes(packed[offset:offset + size], 'little')
+    offset += size
+    size = (len(layout.capsules) + 7) // 8
+    mask = int.from_bytes(packed[offset:offset + size], 'little')
+    data.capsules = [position for i, position in enumerate(layout.capsules) if (mask >> i) & 1]
+    offset += size
+    score, flags = _RESULT.unpack_from(packed, offset)
+    data.score = int(score) if score == int(score) else score
+    data._win, data._lose = bool(flags & 1), bool(flags & 2)
+    data._zobrist = data._computeZobrist()
+    return state
+
+def startState(layout, numAgents):
+    state = GameState()
+    state.initialize(layout, numAgents - 1)
+    return state
+
+class GameLogWriter:
+    """
+    Appends games to a log, creating it if needed.
+    """
+
+    def __init__(self, path, checkpointInterval=CHECKPOINT_INTERVAL):
+        self.checkpointInterval = checkpointInterval
+        self.layoutHashes = set()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            reader = GameLogReader(path)
+            try: self.layoutHashes.update(reader.getLayoutHashes())
+            finally: reader.close()
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(path, 'wb')
+            self.file.write(MAGIC)
+
+    def writeGame(self, game, number=0):
+        """
+        Appends a finished Game (or GameResult) to the log.  The game is
+        replayed to take the checkpoints.
+        """
+        layout = game.state.data.layout
+        numAgents = game.state.getNumAgents()
+        moveHistory = game.moveHistory
+        actions = packActions(moveHistory, numAgents)
+
+        checkpoints = []
+        state = startState(layout, numAgents)
+        for move, (agentIndex, action) in enumerate(moveHistory):
+            state = state.generateSuccessor(agentIndex, action)
+            if (move + 1) % self.checkpointInterval == 0:
+                checkpoints.append(packCheckpoint(state))
+
+        digest = layoutHash(layout)
+        records = []
+        if digest not in self.layoutHashes:
+            text = '\n'.join(layout.layoutText).encode('utf-8')
+            records.append(_RECORD.pack(b'L', len(digest) + len(text)) + digest + text)
+            self.layoutHashes.add(digest)
+        body = (_GAME.pack(digest, number, numAgents, len(moveHistory), self.checkpointInterval)
+                + actions + b''.join(checkpoints))
+        records.append(_RECORD.pack(b'G', len(body)) + body)
+        self.file.write(b''.join(records))
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class GameLogReader:
+    """
+    Reads a game log.  Iterating over it yields a RecordedGame for each game
+    in the order they were written, reading only the record headers; a
+    game's moves and checkpoints are read when they are asked for.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise Exception('%s is not a game log' % path)
+        self.layouts = {}
+
+    def records(self):
+        """
+        Yields the tag, body offset and body length of each record.
+        """
+        offset = len(MAGIC)
+        while True:
+            self.file.seek(offset)
+            header = self.file.read(_RECORD.size)
+            if len(header) < _RECORD.size: return
+            tag, length = _RECORD.unpack(header)
+            yield tag, offset + _RECORD.size, length
+            offset += _RECORD.size + length
+
+    def getLayoutHashes(self):
+        return [self.file.read(20) for tag, offset, length in self.records() if tag == b'L']
+
+    def __iter__(self):
+        for tag, offset, length in self.records():
+            body = self.file.read(length if tag == b'L' else _GAME.size)
+            if tag == b'L':
+                self.layouts[body[:20]] = internLayout(body[20:].decode('utf-8').split('\n'))
+            elif tag == b'G':
+                yield RecordedGame(self, body, offset + _GAME.size)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class RecordedGame:
+    """
+    A game in a GameLogReader.  It reads from the log's file, so use it
+    before the reader is closed.
+    """
+
+    def __init__(self, reader, header, actionsOffset):
+        digest, self.number, self.numAgents, self.numMoves, self.checkpointInterval = _GAME.unpack(header)
+        self.layout = reader.layouts[digest]
+        self.file = reader.file
+        self.actionsOffset = actionsOffset
+        self.checkpointsOffset = actionsOffset + 3 * ((self.numMoves + 7) // 8)
+        self.checkpointSize = checkpointSize(self.layout, self.numAgents)
+
+    def getActions(self, start=0, stop=None):
+        """
+        Returns moves start to stop as (agentIndex, action) pairs, like
+        Game.moveHistory.
+        """
+        if stop is None or stop > self.numMoves: stop = self.numMoves
+        if start >= stop: return []
+        first, last = start // 8, (stop + 7) // 8
+        self.file.seek(self.actionsOffset + 3 * first)
+        return unpackActions(self.file.read(3 * (last - first)), start, stop, self.numAgents)
+
+    def getState(self, move):
+        """
+        Returns the GameState after the first move moves, from the last
+        checkpoint at or before it.
+        """
+        if not 0 <= move <= self.numMoves: raise IndexError('move out of range')
+        checkpoint = move // self.checkpointInterval
+        if checkpoint == 0:
+            state = startState(self.layout, self.numAgents)
+        else:
+            self.file.seek(self.checkpointsOffset + (checkpoint - 1) * self.checkpointSize)
+            state = unpackCheckpoint(self.layout, self.numAgents, self.file.read(self.checkpointSize))
+        for agentIndex, action in self.getActions(checkpoint * self.checkpointInterval, move):
+            state = state.generateSuccessor(agentIndex, action)
+        return state
+
+    def replay(self, start=0):
+        """
+        Yields the GameState after move start and after each later move.
+        """
+        state = self.getState(start)
+        yield state
+        for agentIndex, action in self.getActions(start):
+            state = state.generateSuccessor(agentIndex, action)
+            yield state
@@ -44,10 +44,11 @@ class RandomGhost( GhostAgent ):
 
 class DirectionalGhost( GhostAgent ):
     "A ghost that prefers to rush Pacman, or flee when scared."
-    def __init__( self, index, prob_attack=0.8, prob_scaredFlee=0.8 ):
+    def __init__( self, index, prob_attack=0.8, prob_scaredFlee=0.8, mazeDistance=False ):
         self.index = index
         self.prob_attack = prob_attack
         self.prob_scaredFlee = prob_scaredFlee
+        self.mazeDistance = mazeDistance # Judge moves by maze rather than Manhattan distance
 
     def getDistribution( self, state ):
         # Read variables from state
@@ -64,7 +65,10 @@ class DirectionalGhost( GhostAgent ):
         pacmanPosition = state.getPacmanPosition()
 
         # Select best actions given the state
-        distancesToPacman = [manhattanDistance( pos, pacmanPosition ) for pos in newPositions]
+        if self.mazeDistance:
+            distancesToPacman = [state.getMazeDistance( pacmanPosition, pos ) for pos in newPositions]
+        else:
+            distancesToPacman = [manhattanDistance( pos, pacmanPosition ) for pos in newPositions]
         if isScared:
             bestScore = max( distancesToPacman )
             bestProb = self.prob_scaredFlee
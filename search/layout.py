@@ -13,15 +13,23 @@
 
 
 from util import manhattanDistance
-from game import Grid
+from game import Grid, LegalMoves
 import os
 import random
 
 VISIBILITY_MATRIX_CACHE = {}
+LEGAL_MOVES_CACHE = {}
+LAYOUTS_BY_TEXT = {}
+LAYOUT_REGISTRY = {} # Layouts loaded from files, by absolute path
 
 class Layout:
     """
     A Layout manages the static information about the game board.
+
+    Layouts are never changed once built, so games and states share them:
+    deepCopy returns the layout itself, and game states take their own copy
+    of the food.  Use internLayout or getLayout to get the one Layout of a
+    text rather than parsing it again.
     """
 
     def __init__(self, layoutText):
@@ -35,11 +43,27 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
+        self.initializeLegalMoves()
         # self.initializeVisibilityMatrix()
 
+    def __reduce__(self):
+        # Pickled as its text, and interned again when unpickled
+        return (internLayout, (self.layoutText,))
+
     def getNumGhosts(self):
         return self.numGhosts
 
+    def initializeLegalMoves(self):
+        """
+        Looks up the LegalMoves of this maze, shared by every layout with the
+        same text, and hands them to the walls so Actions can find them.
+        """
+        key = '\n'.join(self.layoutText)
+        if key not in LEGAL_MOVES_CACHE:
+            LEGAL_MOVES_CACHE[key] = LegalMoves(self.walls)
+        self.legalMoves = LEGAL_MOVES_CACHE[key]
+        self.walls.legalMoves = self.legalMoves
+
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
         if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
@@ -90,7 +114,7 @@ class Layout:
         return "\n".join(self.layoutText)
 
     def deepCopy(self):
-        return Layout(self.layoutText[:])
+        return self
 
     def processLayoutText(self, layoutText):
         """
@@ -142,8 +166,21 @@ def getLayout(name, back = 2):
         os.chdir(curdir)
     return layout
 
+def internLayout(layoutText):
+    """
+    Returns the Layout of layoutText, which is only built the first time the
+    text is seen in this process.
+    """
+    key = '\n'.join(layoutText)
+    if key not in LAYOUTS_BY_TEXT:
+        LAYOUTS_BY_TEXT[key] = Layout(list(layoutText))
+    return LAYOUTS_BY_TEXT[key]
+
 def tryToLoad(fullname):
     if(not os.path.exists(fullname)): return None
-    f = open(fullname)
-    try: return Layout([line.strip() for line in f])
-    finally: f.close()
+    path = os.path.abspath(fullname)
+    if path not in LAYOUT_REGISTRY:
+        f = open(fullname)
+        try: LAYOUT_REGISTRY[path] = internLayout([line.strip() for line in f])
+        finally: f.close()
+    return LAYOUT_REGISTRY[path]
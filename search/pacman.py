@@ -43,6 +43,7 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
 from util import nearestPoint
 from util import manhattanDistance
 import util, layout
@@ -71,14 +72,36 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
+    # static variables count the successors generated, for instrumentation.
+    # Recording the explored states themselves hashes every state and keeps it
+    # alive, so it is off unless turned on with setExploredTracking (the
+    # autograder does this around the agents whose expansions it checks).
     explored = set()
+    trackExplored = False
+    numSuccessors = 0
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
+        tmp = GameState.explored
         GameState.explored = set()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
+    def setExploredTracking( enabled ):
+        """
+        Turns recording of explored states on or off, and clears the record.
+        """
+        GameState.trackExplored = enabled
+        GameState.explored = set()
+    setExploredTracking = staticmethod(setExploredTracking)
+
+    def getAndResetNumSuccessors():
+        """
+        Returns how many successors have been generated since the last call.
+        """
+        tmp = GameState.numSuccessors
+        GameState.numSuccessors = 0
+        return tmp
+    getAndResetNumSuccessors = staticmethod(getAndResetNumSuccessors)
+
     def getLegalActions( self, agentIndex=0 ):
         """
         Returns the legal actions for the agent specified.
@@ -103,7 +126,8 @@ class GameState:
 
         # Let agent's logic deal with its action's effects on the board
         if agentIndex == 0:  # Pacman is moving
-            state.data._eaten = [False for i in range(state.getNumAgents())]
+            if True in state.data._eaten:
+                state.data._eaten = [False for i in range(state.getNumAgents())]
             PacmanRules.applyAction( state, action )
         else:                # A ghost is moving
             GhostRules.applyAction( state, action, agentIndex )
@@ -112,7 +136,7 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY # Penalty for waiting around
         else:
-            GhostRules.decrementTimer( state.data.agentStates[agentIndex] )
+            GhostRules.decrementTimer( state.data.writableAgentState(agentIndex) )
 
         # Resolve multi-agent effects
         GhostRules.checkDeath( state, agentIndex )
@@ -120,8 +144,10 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        GameState.numSuccessors += 1
+        if GameState.trackExplored:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
         return state
 
     def getLegalPacmanActions( self ):
@@ -206,6 +232,38 @@ class GameState:
     def hasWall(self, x, y):
         return self.data.layout.walls[x][y]
 
+    def getMazeDistance(self, pos1, pos2):
+        """
+        Returns the length of the shortest path between two positions, or
+        None if there is none.  The distances from pos1 are worked out once
+        per layout, so later calls are O(1).
+        """
+        legalMoves = self.data.layout.legalMoves
+        x, y = pos2
+        return legalMoves.getDistances(pos1)[int(x + 0.5) * legalMoves.height + int(y + 0.5)]
+
+    def getFoodDistance(self, position = None):
+        """
+        Returns the maze distance from position (Pacman's, by default) to the
+        nearest food, or None if no food is left.  The distance field behind
+        it is shared with the other states that have the same food, and
+        repaired rather than recomputed as food is eaten.
+        """
+        if position is None: position = self.getPacmanPosition()
+        x, y = position
+        return self.data.foodDistances()[int(x + 0.5) * self.data.layout.height + int(y + 0.5)]
+
+    def getCapsuleDistance(self, position = None):
+        """
+        Returns the maze distance from position (Pacman's, by default) to the
+        nearest capsule, or None if no capsule is left.
+        """
+        if position is None: position = self.getPacmanPosition()
+        distances = [self.getMazeDistance(capsule, position) for capsule in self.data.capsules]
+        distances = [distance for distance in distances if distance is not None]
+        if not distances: return None
+        return min(distances)
+
     def isLose( self ):
         return self.data._lose
 
@@ -221,7 +279,7 @@ class GameState:
         """
         Generates a new state by copying information from its predecessor.
         """
-        if prevState != None: # Initial state
+        if prevState is not None: # Initial state
             self.data = GameStateData(prevState.data)
         else:
             self.data = GameStateData()
@@ -271,11 +329,11 @@ class ClassicGameRules:
     def __init__(self, timeout=30):
         self.timeout = timeout
 
-    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False):
+    def newGame( self, layout, pacmanAgent, ghostAgents, display, quiet = False, catchExceptions=False, headless=False):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize( layout, len(ghostAgents) )
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        game = Game(agents, display, self, catchExceptions=catchExceptions, headless=headless)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -331,7 +389,7 @@ class PacmanRules:
         """
         Returns a list of possible actions.
         """
-        return Actions.getPossibleActions( state.getPacmanState().configuration, state.data.layout.walls )
+        return list( state.data.layout.legalMoves.getPossibleActions( state.getPacmanState().configuration ) )
     getLegalActions = staticmethod( getLegalActions )
 
     def applyAction( state, action ):
@@ -342,7 +400,7 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.writableAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector( action, PacmanRules.PACMAN_SPEED )
@@ -363,6 +421,7 @@ class PacmanRules:
             state.data.scoreChange += 10
             state.data.food = state.data.food.copy()
             state.data.food[x][y] = False
+            state.data.toggleFoodHash( position )
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -371,11 +430,12 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if( position in state.getCapsules() ):
-            state.data.capsules.remove( position )
+            state.data.capsules = [c for c in state.data.capsules if c != position]
+            state.data.toggleCapsuleHash( position )
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range( 1, len( state.data.agentStates ) ):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.writableAgentState(index).scaredTimer = SCARED_TIME
     consume = staticmethod( consume )
 
 class GhostRules:
@@ -389,13 +449,7 @@ class GhostRules:
         reach a dead end, but can turn 90 degrees at intersections.
         """
         conf = state.getGhostState( ghostIndex ).configuration
-        possibleActions = Actions.getPossibleActions( conf, state.data.layout.walls )
-        reverse = Actions.reverseDirection( conf.direction )
-        if Directions.STOP in possibleActions:
-            possibleActions.remove( Directions.STOP )
-        if reverse in possibleActions and len( possibleActions ) > 1:
-            possibleActions.remove( reverse )
-        return possibleActions
+        return list( state.data.layout.legalMoves.getGhostActions( conf ) )
     getLegalActions = staticmethod( getLegalActions )
 
     def applyAction( state, action, ghostIndex):
@@ -404,7 +458,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.writableAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0: speed /= 2.0
         vector = Actions.directionToVector( action, speed )
@@ -414,7 +468,9 @@ class GhostRules:
     def decrementTimer( ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint( ghostState.configuration.pos )
+            # Replace rather than edit the configuration, which may be shared
+            configuration = ghostState.configuration
+            ghostState.configuration = Configuration( nearestPoint( configuration.pos ), configuration.direction )
         ghostState.scaredTimer = max( 0, timer - 1 )
     decrementTimer = staticmethod( decrementTimer )
 
@@ -435,10 +491,12 @@ class GhostRules:
 
     def collide( state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
+            ghostState = state.data.writableAgentState(agentIndex)
             state.data.scoreChange += 200
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -511,9 +569,11 @@ def readCommand( argv ):
     parser.add_option('-f', '--fixRandomSeed', action='store_true', dest='fixRandomSeed',
                       help='Fixes the random seed to always play the same game', default=False)
     parser.add_option('-r', '--recordActions', action='store_true', dest='record',
-                      help='Writes game histories to a file (named by the time they were played)', default=False)
+                      help='Writes game histories to a game log (named by the time they were played)', default=False)
     parser.add_option('--replay', dest='gameToReplay',
-                      help='A recorded game file (pickle) to replay', default=None)
+                      help='A recorded game file (game log or pickle) to replay', default=None)
+    parser.add_option('--replayNumber', dest='replayNumber', type='int',
+                      help=default('Which game in the game log to replay'), default=0)
     parser.add_option('-a','--agentArgs',dest='agentArgs',
                       help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
     parser.add_option('-x', '--numTraining', dest='numTraining', type='int',
@@ -522,8 +582,12 @@ def readCommand( argv ):
                       help=default('Time to delay between frames; <0 means keyboard'), default=0.1)
     parser.add_option('-c', '--catchExceptions', action='store_true', dest='catchExceptions',
                       help='Turns on exception handling and timeouts during games', default=False)
-    parser.add_option('--timeout', dest='timeout', type='int',
+    parser.add_option('--timeout', dest='timeout', type='float',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('-j', '--workers', dest='workers', type='int',
+                      help=default('Play the games after training in this many processes, without graphics'), default=1)
+    parser.add_option('--headless', action='store_true', dest='headless',
+                      help='Play faster, without graphics, timeouts or copies of the state for the agents (for trusted agents)', default=False)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -538,7 +602,7 @@ def readCommand( argv ):
     if args['layout'] == None: raise Exception("The layout " + options.layout + " cannot be found")
 
     # Choose a Pacman agent
-    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics)
+    noKeyboard = options.gameToReplay == None and (options.textGraphics or options.quietGraphics or options.headless)
     pacmanType = loadAgent(options.pacman, noKeyboard)
     agentOpts = parseAgentArgs(options.agentArgs)
     if options.numTraining > 0:
@@ -557,7 +621,7 @@ def readCommand( argv ):
     args['ghosts'] = [ghostType( i+1 ) for i in range( options.numGhosts )]
 
     # Choose a display format
-    if options.quietGraphics:
+    if options.quietGraphics or options.headless:
         import textDisplay
         args['display'] = textDisplay.NullGraphics()
     elif options.textGraphics:
@@ -571,14 +635,29 @@ def readCommand( argv ):
     args['record'] = options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['workers'] = options.workers
+    args['headless'] = options.headless
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
         print('Replaying recorded game %s.' % options.gameToReplay)
-        import cPickle
-        f = open(options.gameToReplay)
-        try: recorded = cPickle.load(f)
+        import gameLog
+        f = open(options.gameToReplay, 'rb')
+        try: isLog = f.read(len(gameLog.MAGIC)) == gameLog.MAGIC
         finally: f.close()
+        if isLog:
+            reader = gameLog.GameLogReader(options.gameToReplay)
+            try:
+                for game in reader:
+                    if game.number == options.replayNumber: break
+                else: raise Exception('Game %d is not in %s' % (options.replayNumber, options.gameToReplay))
+                recorded = {'layout': game.layout, 'actions': game.getActions(), 'numGhosts': game.numAgents - 1}
+            finally: reader.close()
+        else:
+            import cPickle
+            f = open(options.gameToReplay)
+            try: recorded = cPickle.load(f)
+            finally: f.close()
         recorded['display'] = args['display']
         replayGame(**recorded)
         sys.exit(0)
@@ -608,10 +687,11 @@ def loadAgent(pacman, nographics):
                 return getattr(module, pacman)
     raise Exception('The agent ' + pacman + ' is not specified in any *Agents.py.')
 
-def replayGame( layout, actions, display ):
+def replayGame( layout, actions, display, numGhosts = None ):
     import pacmanAgents, ghostAgents
     rules = ClassicGameRules()
-    agents = [pacmanAgents.GreedyAgent()] + [ghostAgents.RandomGhost(i+1) for i in range(layout.getNumGhosts())]
+    if numGhosts is None: numGhosts = layout.getNumGhosts()
+    agents = [pacmanAgents.GreedyAgent()] + [ghostAgents.RandomGhost(i+1) for i in range(numGhosts)]
     game = rules.newGame( layout, agents[0], agents[1:], display )
     state = game.state
     display.initialize(state.data)
@@ -626,14 +706,113 @@ def replayGame( layout, actions, display ):
 
     display.finish()
 
-def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30 ):
+def openGameLog():
+    """
+    Opens a game log (see gameLog.py) for runGames to record games in,
+    named by the time.
+    """
+    import time, gameLog
+    fname = 'recorded-games-' + '-'.join([str(t) for t in time.localtime()[1:6]]) + '.pacmanlog'
+    return gameLog.GameLogWriter(fname)
+
+class GameResult:
+    """
+    What a game played in a worker process sends back to runGames: the final
+    state and the other parts of a Game that runGames' callers read.
+    """
+    def __init__( self, game ):
+        self.state = game.state
+        self.moveHistory = game.moveHistory
+        self.agentTimeout = game.agentTimeout
+        self.agentCrashed = game.agentCrashed
+
+_gameWorker = None
+
+def _agentRandomStreams( agents ):
+    """
+    Returns the random.Random streams the agents keep as attributes, each
+    with its state now.
+    """
+    streams = []
+    for agent in agents:
+        for name, value in sorted( vars( agent ).items() ):
+            if isinstance( value, random.Random ):
+                streams.append( ( value, value.getstate() ) )
+    return streams
+
+def _initGameWorker( layout, pacman, ghosts, timeout, catchExceptions, headless ):
+    """
+    Gives a runParallelGames worker its own copy of the agents and rules.
+    """
+    global _gameWorker
+    import __main__, textDisplay
+    __main__.__dict__['_display'] = textDisplay.NullGraphics()
+    streams = _agentRandomStreams( [pacman] + ghosts )
+    _gameWorker = ( layout, pacman, ghosts, ClassicGameRules( timeout ), catchExceptions, headless, streams )
+
+def _playGame( seed ):
+    import textDisplay
+    layout, pacman, ghosts, rules, catchExceptions, headless, streams = _gameWorker
+    random.seed( seed )
+    # The agents' own streams start each game from the game's seed rather
+    # than from wherever the worker's previous game left them
+    for i, ( stream, state ) in enumerate( streams ):
+        stream.setstate( state )
+        stream.seed( '%s:%d:%d' % ( seed, i, stream.getrandbits( 64 ) ) )
+    game = rules.newGame( layout, pacman, ghosts, textDisplay.NullGraphics(), False, catchExceptions, headless )
+    game.run()
+    return GameResult( game )
+
+def runParallelGames( layout, pacman, ghosts, numGames, catchExceptions=False, timeout=30, workers=2, headless=False ):
+    """
+    Plays numGames games without graphics in worker processes, and yields
+    (game number, GameResult) pairs as the games finish.  Each game is
+    seeded by one draw from the random module and its number, as are the
+    random streams the agents keep, so its outcome does not depend on how
+    many workers there are.
+
+    The workers are forked, so that they inherit the agents as they are
+    rather than a pickled copy (learning agents hold lambdas, which do not
+    pickle).
+    """
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    if 'fork' not in multiprocessing.get_all_start_methods():
+        raise Exception( 'Playing games in worker processes needs the fork start method' )
+    base = random.getrandbits( 64 )
+    pool = ProcessPoolExecutor( workers, mp_context = multiprocessing.get_context( 'fork' ),
+                                initializer = _initGameWorker,
+                                initargs = ( layout, pacman, ghosts, timeout, catchExceptions, headless ) )
+    try:
+        futures = dict( [ ( pool.submit( _playGame, '%d:%d' % ( base, i ) ), i ) for i in range( numGames ) ] )
+        for future in as_completed( futures ):
+            yield futures[future], future.result()
+    finally:
+        pool.shutdown( cancel_futures = True )
+
+def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0, catchExceptions=False, timeout=30, workers=1, headless=False ):
+    """
+    Plays numGames games and prints a report of the last numGames -
+    numTraining.  headless plays them with Game.runHeadless, which is
+    faster but has no display, timeouts or protection from the agents.
+    """
     import __main__
     __main__.__dict__['_display'] = display
 
     rules = ClassicGameRules(timeout)
     games = []
+    log = None
+    if record: log = openGameLog()
+    if headless:
+        import textDisplay
+        display = textDisplay.NullGraphics()
 
-    for i in range( numGames ):
+    # With workers, only the training games are played here, in order, so
+    # the agent has learned from them before it is copied to the workers.
+    numSequential = numGames
+    if workers > 1: numSequential = min( numTraining, numGames )
+
+    for i in range( numSequential ):
         beQuiet = i < numTraining
         if beQuiet:
                 # Suppress output and graphics
@@ -643,17 +822,19 @@ def runGames( layout, pacman, ghosts, display, numGames, record, numTraining = 0
         else:
             gameDisplay = display
             rules.quiet = False
-        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions)
+        game = rules.newGame( layout, pacman, ghosts, gameDisplay, beQuiet, catchExceptions, headless)
         game.run()
         if not beQuiet: games.append(game)
 
-        if record:
-            import time, cPickle
-            fname = ('recorded-game-%d' % (i + 1)) +  '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            cPickle.dump(components, f)
-            f.close()
+        if log: log.writeGame( game, i )
+
+    if numGames > numSequential:
+        results = [None] * ( numGames - numSequential )
+        for i, game in runParallelGames( layout, pacman, ghosts, numGames - numSequential, catchExceptions, timeout, workers, headless ):
+            results[i] = game
+            if log: log.writeGame( game, numSequential + i )
+        games.extend( results )
+    if log: log.close()
 
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
@@ -61,6 +61,24 @@ class SearchProblem:
         """
         util.raiseNotDefined()
 
+    def getGoalStates(self):
+        """
+        Returns the list of goal states, for problems whose goals can be
+        listed explicitly.  Only the bidirectional searches need this.
+        """
+        util.raiseNotDefined()
+
+    def getPredecessors(self, state):
+        """
+          state: Search state
+
+        For a given state, this should return a list of triples,
+        (predecessor, action, stepCost), where 'action' taken in
+        'predecessor' leads to the current state at a cost of 'stepCost'.
+        Only the bidirectional searches need this.
+        """
+        util.raiseNotDefined()
+
 
 def tinyMazeSearch(problem):
     """
@@ -75,41 +93,39 @@ def tinyMazeSearch(problem):
 def depthFirstSearch(problem):
     """Search the deepest nodes in the search tree first."""
 
-    # Create the initial state and path.
+    # Create the initial state.
     state = problem.getStartState()
-    path = []
 
     # If the starting point is the goal, return the path.
     if problem.isGoalState(state):
-        return path
+        return []
 
-    # Create a Stack and push the initial start state.
+    # Create the node table and a Stack of node ids, and push the initial start state.
+    nodes = util.SearchNodeTable()
     frontier = util.Stack()
-    frontier.push((state, path))
+    frontier.push(nodes.add(state))
 
     # Create a set of visited states.
     visited = set()
 
     # Continuosly search for the next possible successor until a goal state is found.
     while not frontier.isEmpty():
-        state, path = frontier.pop()
+        node = frontier.pop()
+        state = nodes.getState(node)
 
         # If the current state is the goal, return the path.
         if problem.isGoalState(state):
-            return path
+            return nodes.getPath(node)
 
         # Add the current state to the set.
         visited.add(state)
 
         # Check for each possible successor given the current state.
-        for successor in problem.getSuccessors(state):
-
-            # Set state and path for the current successor.
-            successor_state, successor_path = successor[0], (path + [successor[1]])
+        for successor_state, action, step_cost in problem.getSuccessors(state):
 
             # If the successor has not been visited, push it to the frontier.
             if successor_state not in visited:
-                frontier.push((successor_state, successor_path))
+                frontier.push(nodes.add(successor_state, node, action))
 
     # Return an empty path if no goal state is found.
     return []
@@ -117,46 +133,37 @@ def depthFirstSearch(problem):
 def breadthFirstSearch(problem):
     """Search the shallowest nodes in the search tree first."""
 
-    # Create the initial state and path.
+    # Create the initial state.
     state = problem.getStartState()
-    path = []
 
     # If the starting point is the goal, return the path.
     if problem.isGoalState(state):
-        return path
+        return []
 
-    # Create a Queue and push the initial start state.
+    # Create the node table and a Queue of node ids, and push the initial start state.
+    nodes = util.SearchNodeTable()
     frontier = util.Queue()
-    frontier.push((state, path))
+    frontier.push(nodes.add(state))
 
-    # Create a set of visited states.
-    visited = set()
+    # Create a set of states that have been visited or are waiting in the queue.
+    reached = set([state])
 
     # Continuosly search for the next possible successor until a goal state is found.
     while not frontier.isEmpty():
-        state, path = frontier.pop()
+        node = frontier.pop()
+        state = nodes.getState(node)
 
         # If the current state is the goal, return the path.
         if problem.isGoalState(state):
-            return path
-
-        # Add the current state to the set.
-        visited.add(state)
-
-        # Add every state in the frontier/queue to a list.
-        states_in_queue = []
-        for s in frontier.list:
-            states_in_queue.append(s[0])
+            return nodes.getPath(node)
 
         # Check for each possible successor given the current state.
-        for successor in problem.getSuccessors(state):
+        for successor_state, action, step_cost in problem.getSuccessors(state):
 
-            # Set state and path for the current successor.
-            successor_state, successor_path = successor[0], (path + [successor[1]])
-
-            # If the successor has not been visited, push it to the frontier.
-            if successor_state not in visited and successor_state not in states_in_queue:
-                frontier.push((successor_state, successor_path))
+            # If the successor has not been visited or queued, push it to the frontier.
+            if successor_state not in reached:
+                reached.add(successor_state)
+                frontier.push(nodes.add(successor_state, node, action))
 
     # Return an empty path if no goal state is found.
     return []
@@ -164,59 +171,48 @@ def breadthFirstSearch(problem):
 def uniformCostSearch(problem):
     """Search the node of least total cost first."""
 
-    # Create the initial state and path.
+    # Create the initial state.
     state = problem.getStartState()
-    path = []
 
     # If the starting point is the goal, return the path.
     if problem.isGoalState(state):
-        return path
+        return []
 
-    # Create a PriorityQueue and push the initial start state.
-    frontier = util.PriorityQueue()
-    frontier.push((state, path), 0)
+    # Create the node table and an IndexedPriorityQueue of node ids keyed by their state.
+    nodes = util.SearchNodeTable()
+    frontier = util.IndexedPriorityQueue(keyFunction=nodes.getState)
+    frontier.push(nodes.add(state), 0)
 
     # Create a set of visited states.
     visited = set()
 
     # Continuosly search for the next possible successor until a goal state is found.
     while not frontier.isEmpty():
-        state, path = frontier.pop()
+        node = frontier.pop()
+        state, cost = nodes.getState(node), nodes.getCost(node)
 
         # If the current state is the goal, return the path.
         if problem.isGoalState(state):
-            return path
+            return nodes.getPath(node)
 
         # Add the current state to the set.
         visited.add(state)
 
-        # Add every state in the frontier/priority queue to a list.
-        states_in_priority_queue = []
-        for s in frontier.heap:
-            states_in_priority_queue.append(s[2][0])
-
         # Check for each possible successor given the current state.
-        for successor in problem.getSuccessors(state):
-
-            # Set state, path, and cost for the current successor.
-            successor_state, successor_path = successor[0], (path + [successor[1]])
-            path_cost = problem.getCostOfActions(successor_path)
+        for successor_state, action, step_cost in problem.getSuccessors(state):
 
-            # If the successor has not been visited, push it to the frontier.
-            if successor_state not in visited and successor_state not in states_in_priority_queue:
-                frontier.push((successor_state, successor_path), path_cost)
+            # The successor's path cost is its parent's cost plus the step cost.
+            path_cost = cost + step_cost
 
-            # If the state has already been visited, compare and update the costs of its path.
-            else:
-                # Loop through the PriorityQueue list until the current successor is found inside it.
-                for i in range(len(states_in_priority_queue)):
-                    if successor_state == states_in_priority_queue[i]:
-                        stored_cost = frontier.heap[i][0]
+            # If the successor has not been visited or queued, push it to the frontier.
+            if successor_state not in visited and successor_state not in frontier:
+                frontier.push(nodes.add(successor_state, node, action, path_cost), path_cost)
 
-                        # If the current path cost is less, update the tuple and the current successor in the frontier.
-                        if path_cost <= stored_cost:
-                            frontier.heap[i] = (stored_cost, frontier.heap[i][1] , (successor_state, successor_path) )
-                            frontier.update((successor_state, successor_path), path_cost)
+            # If the successor is already in the frontier, keep the cheaper of the two paths.
+            elif successor_state in frontier:
+                queued = frontier.item(successor_state)
+                if frontier.decreaseKey(successor_state, queued, path_cost):
+                    nodes.reparent(queued, node, action, path_cost)
 
     # Return an empty path if no goal state is found.
     return []
@@ -231,70 +227,142 @@ def nullHeuristic(state, problem=None):
 def aStarSearch(problem, heuristic=nullHeuristic):
     """Search the node that has the lowest combined cost and heuristic first."""
 
-    # Create the initial state and path.
+    # Create the initial state.
     state = problem.getStartState()
-    path = []
 
     # If the starting point is the goal, return the path.
     if problem.isGoalState(state):
-        return path
+        return []
 
     # Calculate the combined cost and heuristic of the initial state.
-    heuristic_cost = problem.getCostOfActions(path) + heuristic(state, problem)
+    heuristic_cost = heuristic(state, problem)
 
-    # Create a PriorityQueue and push the initial start state.
-    frontier = util.PriorityQueue()
-    frontier.push((state, path), heuristic_cost)
+    # Create the node table and an IndexedPriorityQueue of node ids keyed by their state.
+    nodes = util.SearchNodeTable()
+    frontier = util.IndexedPriorityQueue(keyFunction=nodes.getState)
+    frontier.push(nodes.add(state), heuristic_cost)
 
     # Create a set of visited states.
     visited = set()
 
     # Continuosly search for the next possible successor until a goal state is found.
     while not frontier.isEmpty():
-        state, path = frontier.pop()
+        node = frontier.pop()
+        state, cost = nodes.getState(node), nodes.getCost(node)
 
         # If the current state is the goal, return the path.
         if problem.isGoalState(state):
-            return path
+            return nodes.getPath(node)
 
         # Add the current state to the set.
         visited.add(state)
 
-        # Add every state in the frontier/priority queue to a list.
-        states_in_priority_queue = []
-        for s in frontier.heap:
-            states_in_priority_queue.append(s[2][0])
-
         # Check for each possible successor given the current state.
-        for successor in problem.getSuccessors(state):
+        for successor_state, action, step_cost in problem.getSuccessors(state):
+
+            # Visited states are closed; their cost can no longer improve.
+            if successor_state in visited:
+                continue
 
-            # Set state and path for the current successor.
-            successor_state, successor_path = successor[0], (path + [successor[1]])
-            
             # Calculate the combined cost and heuristic of the successor.
-            successor_heuristic_cost = problem.getCostOfActions(successor_path) + heuristic(successor_state, problem)
+            path_cost = cost + step_cost
+            successor_heuristic_cost = path_cost + heuristic(successor_state, problem)
 
-            # If the successor has not been visited, push it to the frontier.
-            if successor_state not in visited and successor_state not in states_in_priority_queue:
-                frontier.push((successor_state, successor_path), successor_heuristic_cost)
+            # If the successor has not been queued, push it to the frontier.
+            if successor_state not in frontier:
+                frontier.push(nodes.add(successor_state, node, action, path_cost), successor_heuristic_cost)
 
-            # If the state has already been visited, compare and update the costs of its path.
+            # If the successor is already in the frontier, keep the cheaper of the two paths.
             else:
-                # Loop through the PriorityQueue list until the current successor is found inside it.
-                for i in range(len(states_in_priority_queue)):
-                    if successor_state == states_in_priority_queue[i]:
-                        stored_cost = frontier.heap[i][0]
-
-                        # If the current path cost is less, update the tuple and the current successor in the frontier.
-                        if successor_heuristic_cost <= stored_cost:
-                            frontier.heap[i] = (stored_cost, frontier.heap[i][1] , (successor_state, successor_path) )
-                            frontier.update((successor_state, successor_path), successor_heuristic_cost)
+                queued = frontier.item(successor_state)
+                if frontier.decreaseKey(successor_state, queued, successor_heuristic_cost):
+                    nodes.reparent(queued, node, action, path_cost)
 
     # Return an empty path if no goal state is found.
     return []
 
+def bidirectionalSearch(problem):
+    """
+    Search forward from the start and backward from the goals at the same
+    time, always growing the smaller frontier, until the cheapest path through
+    a state reached by both searches is known.  The problem must implement
+    getGoalStates and getPredecessors.  On uniform step costs each side only
+    has to explore to about half the solution depth.
+    """
+    path, start, goal = multiGoalSearch(problem, [problem.getStartState()], problem.getGoalStates())
+    return path
+
+def multiGoalSearch(problem, starts, goals):
+    """
+    Bidirectional uniform cost search between any of the start states and any
+    of the goal states.  Returns a triple (path, start, goal) describing the
+    cheapest such path, or ([], None, None) if no goal can be reached.
+    """
+    goals = list(goals)
+    for start in starts:
+        if start in goals:
+            return [], start, start
+
+    # Each direction has its own node table, frontier and map of reached states.
+    # Backward nodes point towards a goal; their actions are the forward moves.
+    tables = (util.SearchNodeTable(), util.SearchNodeTable())
+    frontiers = (util.IndexedPriorityQueue(keyFunction=tables[0].getState),
+                 util.IndexedPriorityQueue(keyFunction=tables[1].getState))
+    reached = ({}, {})
+    expand = (problem.getSuccessors, problem.getPredecessors)
+    for side, roots in enumerate((starts, goals)):
+        for root in roots:
+            if root not in reached[side]:
+                reached[side][root] = tables[side].add(root)
+                frontiers[side].push(reached[side][root], 0)
+    closed = (set(), set())
+
+    # The cheapest complete path seen so far and the state where its two halves meet.
+    best_cost, meeting = float('inf'), None
+
+    while not frontiers[0].isEmpty() and not frontiers[1].isEmpty():
+        # No path through the remaining frontiers can beat the best one found.
+        if frontiers[0].peekPriority() + frontiers[1].peekPriority() >= best_cost:
+            break
+
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        other = 1 - side
+        nodes, frontier = tables[side], frontiers[side]
+        node = frontier.pop()
+        state, cost = nodes.getState(node), nodes.getCost(node)
+        closed[side].add(state)
+
+        for neighbor, action, step_cost in expand[side](state):
+            if neighbor in closed[side]:
+                continue
+            path_cost = cost + step_cost
+
+            # Push the neighbor, or keep the cheaper of the two paths to it.
+            if neighbor not in frontier:
+                reached[side][neighbor] = nodes.add(neighbor, node, action, path_cost)
+                frontier.push(reached[side][neighbor], path_cost)
+            elif frontier.decreaseKey(neighbor, reached[side][neighbor], path_cost):
+                nodes.reparent(reached[side][neighbor], node, action, path_cost)
+
+            # A state reached from both sides joins a complete path.
+            if neighbor in reached[other]:
+                total = nodes.getCost(reached[side][neighbor]) + tables[other].getCost(reached[other][neighbor])
+                if total < best_cost:
+                    best_cost, meeting = total, neighbor
+
+    if meeting is None:
+        return [], None, None
+
+    forward, backward = reached[0][meeting], reached[1][meeting]
+    path = tables[0].getPath(forward)
+    path.extend(reversed(tables[1].getPath(backward)))
+    start = tables[0].getState(tables[0].getRoot(forward))
+    goal = tables[1].getState(tables[1].getRoot(backward))
+    return path, start, goal
+
 # Abbreviations
 bfs = breadthFirstSearch
 dfs = depthFirstSearch
 astar = aStarSearch
 ucs = uniformCostSearch
+bidi = bidirectionalSearch
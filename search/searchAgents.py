@@ -209,6 +209,33 @@ class PositionSearchProblem(search.SearchProblem):
 
         return successors
 
+    def getGoalStates(self):
+        return [self.goal]
+
+    def getPredecessors(self, state):
+        """
+        Returns predecessor states, the actions that lead from them to state,
+        and the cost of those actions.  Moves on the grid are reversible, so
+        these are the neighbors of state, each reached by the reverse move.
+        """
+
+        predecessors = []
+        cost = self.costFn(state)
+        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
+            x,y = state
+            dx, dy = Actions.directionToVector(action)
+            prevx, prevy = int(x - dx), int(y - dy)
+            if not self.walls[prevx][prevy]:
+                predecessors.append( ( (prevx, prevy), action, cost) )
+
+        # Bookkeeping for display purposes
+        self._expanded += 1
+        if state not in self._visited:
+            self._visited[state] = True
+            self._visitedlist.append(state)
+
+        return predecessors
+
     def getCostOfActions(self, actions):
         """
         Returns the cost of a particular sequence of actions. If those actions
@@ -596,6 +623,9 @@ class AnyFoodSearchProblem(PositionSearchProblem):
         # If there is food at the current position, return True.
         return self.food[x][y]
 
+    def getGoalStates(self):
+        return self.food.asList()
+
 def mazeDistance(point1, point2, gameState):
     """
     Returns the maze distance between any two points, using the search functions
@@ -605,11 +635,110 @@ def mazeDistance(point1, point2, gameState):
     Example usage: mazeDistance( (2,4), (5,6), gameState)
 
     This might be a useful helper function for your ApproximateSearchAgent.
+    Points that are not connected are an infinite distance apart, so sums and
+    comparisons of distances still work.
     """
     x1, y1 = point1
     x2, y2 = point2
     walls = gameState.getWalls()
     assert not walls[x1][y1], 'point1 is a wall: ' + str(point1)
     assert not walls[x2][y2], 'point2 is a wall: ' + str(point2)
-    prob = PositionSearchProblem(gameState, start=point1, goal=point2, warn=False, visualize=False)
-    return len(search.bfs(prob))
+    return MazeDistanceOracle.forLayout(gameState.data.layout).getDistance(point1, point2)
+
+class MazeDistanceOracle:
+    """
+    Holds the maze distance between every pair of open cells of a layout, so
+    that after a one-time cost of one breadth first search per cell every
+    distance query is a single array lookup.
+
+    Distances are stored row by row in a flat array of unsigned shorts, with
+    UNREACHABLE for pairs of cells that are not connected.  Oracles are cached
+    per process keyed by the layout text and cacheDir; if cacheDir is given
+    the matrix is also saved there and memory-mapped back in by later
+    processes.
+    """
+    UNREACHABLE = 65535
+    _cache = {}
+
+    def forLayout(layout, cacheDir=None):
+        "Returns the (cached) oracle for a Layout"
+        key = '\n'.join(layout.layoutText)
+        if (key, cacheDir) not in MazeDistanceOracle._cache:
+            MazeDistanceOracle._cache[key, cacheDir] = MazeDistanceOracle(layout.walls, key, cacheDir)
+        return MazeDistanceOracle._cache[key, cacheDir]
+    forLayout = staticmethod(forLayout)
+
+    def __init__(self, walls, key=None, cacheDir=None):
+        self.walls = walls
+        self.cells = walls.asList(False)
+        self.index = dict((cell, i) for i, cell in enumerate(self.cells))
+        self.size = len(self.cells)
+        self.distances = None
+        if cacheDir is not None:
+            import hashlib, os
+            if key is None: key = str(walls)
+            name = hashlib.sha1(key.encode()).hexdigest() + '.dist'
+            path = os.path.join(cacheDir, name)
+            self.distances = self._load(path)
+            if self.distances is None:
+                self.distances = self._computeDistances()
+                self._save(path)
+        else:
+            self.distances = self._computeDistances()
+
+    def getDistance(self, point1, point2):
+        "Returns the maze distance between two open cells, or infinity if they are not connected"
+        n = self.size
+        d = self.distances[self.index[point1] * n + self.index[point2]]
+        if d == self.UNREACHABLE: return float('inf')
+        return d
+
+    def getDistancesFrom(self, point):
+        """
+        Returns the row of distances from point, indexed like self.cells, with
+        UNREACHABLE for the cells that are not connected to it.
+        """
+        n = self.size
+        start = self.index[point] * n
+        return self.distances[start:start + n]
+
+    def _computeDistances(self):
+        from array import array
+        n, index = self.size, self.index
+        neighbors = []
+        for x, y in self.cells:
+            neighbors.append([index[p] for p in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)) if p in index])
+
+        distances = array('H', [self.UNREACHABLE]) * (n * n)
+        for source in range(n):
+            row = source * n
+            distances[row + source] = 0
+            frontier, depth = [source], 0
+            while frontier:
+                depth += 1
+                nextFrontier = []
+                for cell in frontier:
+                    for neighbor in neighbors[cell]:
+                        if distances[row + neighbor] == self.UNREACHABLE:
+                            distances[row + neighbor] = depth
+                            nextFrontier.append(neighbor)
+                frontier = nextFrontier
+        return distances
+
+    def _save(self, path):
+        import os, tempfile
+        directory = os.path.dirname(path) or '.'
+        fd, tmp = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            self.distances.tofile(f)
+        os.replace(tmp, path)
+
+    def _load(self, path):
+        import mmap, os
+        from array import array
+        expected = self.size * self.size * array('H').itemsize
+        if not os.path.exists(path) or os.path.getsize(path) != expected or expected == 0:
+            return None
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._mmap).cast('H')
@@ -0,0 +1,307 @@
+import heapq
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import layout
+import search
+import searchAgents
+import util
+from graphProblem import GraphProblem
+from pacman import GameState
+
+class TestIndexedPriorityQueue(unittest.TestCase):
+
+    def popAll(self, queue):
+        items = []
+        while not queue.isEmpty():
+            items.append(queue.pop())
+        return items
+
+    def test_update_decreases_key(self):
+        queue = util.IndexedPriorityQueue()
+        for item, priority in [('a', 5), ('b', 3), ('c', 4)]:
+            queue.push(item, priority)
+        queue.update('a', 1)
+        self.assertEqual(queue.getPriority('a'), 1)
+        # A higher priority leaves a queued item alone
+        queue.update('b', 9)
+        self.assertEqual(queue.getPriority('b'), 3)
+        # An item that is not queued is pushed
+        queue.update('d', 2)
+        self.assertEqual(len(queue), 4)
+        self.assertEqual(self.popAll(queue), ['a', 'd', 'b', 'c'])
+
+    def test_update_replaces_item_with_same_key(self):
+        queue = util.IndexedPriorityQueue(keyFunction=lambda node: node[0])
+        queue.push(('x', 'long way'), 7)
+        queue.push(('y', 'only way'), 5)
+        queue.update(('x', 'short way'), 2)
+        self.assertEqual(queue.item('x'), ('x', 'short way'))
+        self.assertEqual(self.popAll(queue), [('x', 'short way'), ('y', 'only way')])
+
+    def test_remove_is_skipped_by_pop(self):
+        queue = util.IndexedPriorityQueue()
+        for priority, item in enumerate('abcde'):
+            queue.push(item, priority)
+        queue.remove('a')
+        queue.remove('c')
+        self.assertEqual(len(queue), 3)
+        self.assertFalse('a' in queue)
+        self.assertTrue('b' in queue)
+        self.assertEqual(self.popAll(queue), ['b', 'd', 'e'])
+        self.assertRaises(IndexError, queue.pop)
+
+    def test_removed_key_can_be_pushed_again(self):
+        queue = util.IndexedPriorityQueue()
+        queue.push('a', 1)
+        queue.push('b', 2)
+        queue.remove('a')
+        queue.push('a', 3)
+        self.assertEqual(self.popAll(queue), ['b', 'a'])
+
+    def test_peek_priority(self):
+        queue = util.IndexedPriorityQueue()
+        queue.push('a', 4)
+        queue.push('b', 2)
+        self.assertEqual(queue.peekPriority(), 2)
+        queue.update('a', 1)
+        self.assertEqual(queue.peekPriority(), 1)
+        # Removed items at the top are not reported
+        queue.remove('a')
+        self.assertEqual(queue.peekPriority(), 2)
+        self.assertEqual(len(queue), 1)
+        self.assertEqual(queue.pop(), 'b')
+
+    def test_ties_pop_in_insertion_order(self):
+        queue = util.IndexedPriorityQueue()
+        for item in 'fedcba':
+            queue.push(item, 1)
+        queue.push('z', 0)
+        # Lowering a key to a tie keeps its original place in the order
+        queue.push('y', 2)
+        queue.update('y', 1)
+        queue.update('c', 1)
+        self.assertEqual(self.popAll(queue), ['z'] + list('fedcba') + ['y'])
+
+    def test_matches_heapq(self):
+        rng = random.Random(0)
+        for trial in range(20):
+            queue = util.IndexedPriorityQueue()
+            # heapq holds [priority, insertion count, key]; the count breaks ties
+            # as the queue does, and entries that went stale are skipped on pop
+            heap, live, count = [], {}, 0
+            for step in range(300):
+                choice = rng.random()
+                key = rng.randrange(40)
+                if choice < 0.5:
+                    priority = rng.randrange(100)
+                    if key in live:
+                        if priority < live[key][0]:
+                            entry = [priority, live[key][1], key]
+                            live[key] = entry
+                            heapq.heappush(heap, entry)
+                    else:
+                        live[key] = [priority, count, key]
+                        heapq.heappush(heap, live[key])
+                        count += 1
+                    queue.update(key, priority)
+                elif choice < 0.65:
+                    if key in live:
+                        del live[key]
+                        queue.remove(key)
+                elif live:
+                    while live.get(heap[0][2]) is not heap[0]:
+                        heapq.heappop(heap)
+                    self.assertEqual(queue.peekPriority(), heap[0][0])
+                    entry = heapq.heappop(heap)
+                    del live[entry[2]]
+                    self.assertEqual(queue.pop(), entry[2])
+                self.assertEqual(len(queue), len(live))
+                self.assertEqual(sorted(key for key in range(40) if key in queue), sorted(live))
+
+def loadGameState(layoutName):
+    state = GameState()
+    state.initialize(layout.getLayout(layoutName), 0)
+    return state
+
+class MultiGoalPositionProblem(searchAgents.PositionSearchProblem):
+    "A PositionSearchProblem with several goal cells and any step costs"
+
+    def __init__(self, gameState, goals, costFn=lambda pos: 1, start=None):
+        searchAgents.PositionSearchProblem.__init__(self, gameState, costFn, start=start,
+                                                    warn=False, visualize=False)
+        self.goals = list(goals)
+
+    def isGoalState(self, state):
+        return state in self.goals
+
+    def getGoalStates(self):
+        return self.goals
+
+class ReversibleGraphProblem(GraphProblem):
+    "A GraphProblem that can also be searched backward from its goals"
+
+    def __init__(self, start, goals, edges):
+        GraphProblem.__init__(self, start, goals, edges)
+        self.predecessors = {}
+        for src, action, dst, cost in edges:
+            self.predecessors.setdefault(dst, []).append((src, action, cost))
+
+    def getSuccessors(self, state):
+        return self.edges.get(state, [])
+
+    def getGoalStates(self):
+        return sorted(self.goals)
+
+    def getPredecessors(self, state):
+        return self.predecessors.get(state, [])
+
+    def getCostOfActions(self, actions, start=None):
+        state, cost = self.start if start is None else start, 0
+        for action in actions:
+            state, stepCost = [(dst, c) for dst, a, c in self.edges[state] if a == action][0]
+            cost += stepCost
+        return cost
+
+# Two goals; the cheapest route to each runs through more, cheaper edges
+WEIGHTED_GRAPH = [
+    ('S', 'S->A', 'A', 1), ('S', 'S->B', 'B', 4), ('S', 'S->G1', 'G1', 12),
+    ('A', 'A->B', 'B', 1), ('A', 'A->C', 'C', 5), ('B', 'B->C', 'C', 1),
+    ('C', 'C->D', 'D', 1), ('C', 'C->G1', 'G1', 7), ('D', 'D->G1', 'G1', 2),
+    ('D', 'D->E', 'E', 3), ('E', 'E->G2', 'G2', 1), ('B', 'B->G2', 'G2', 10),
+    ('T', 'T->E', 'E', 2), ('F', 'F->S', 'S', 1),
+]
+
+class TestBidirectionalSearch(unittest.TestCase):
+    COSTS = [lambda pos: 1, lambda pos: 2 ** pos[0], lambda pos: 0.5 ** pos[0],
+             lambda pos: 1 + (pos[0] * 7 + pos[1] * 3) % 5]
+
+    def test_weighted_graph(self):
+        for goals, cost in [(['G1'], 6), (['G2'], 8), (['G1', 'G2'], 6)]:
+            problem = ReversibleGraphProblem('S', goals, WEIGHTED_GRAPH)
+            self.assertEqual(problem.getCostOfActions(search.ucs(problem)), cost)
+            self.assertEqual(problem.getCostOfActions(search.bidirectionalSearch(problem)), cost)
+
+    def test_weighted_graph_many_starts(self):
+        problem = ReversibleGraphProblem('S', ['G1', 'G2'], WEIGHTED_GRAPH)
+        path, start, goal = search.multiGoalSearch(problem, ['S', 'T', 'F'], ['G1', 'G2'])
+        self.assertEqual((start, goal), ('T', 'G2'))
+        self.assertEqual(problem.getCostOfActions(path, start), 3)
+        self.assertEqual(search.multiGoalSearch(problem, ['G2'], ['S']), ([], None, None))
+        self.assertEqual(search.multiGoalSearch(problem, ['A', 'G1'], ['G1']), ([], 'G1', 'G1'))
+
+    def test_mazes_match_ucs(self):
+        for layoutName in ['tinyMaze', 'mediumMaze']:
+            gameState = loadGameState(layoutName)
+            food = gameState.getFood().asList()
+            for costFn in self.COSTS:
+                problem = MultiGoalPositionProblem(gameState, food, costFn)
+                expected = problem.getCostOfActions(search.ucs(problem))
+                path = search.bidirectionalSearch(problem)
+                self.assertAlmostEqual(problem.getCostOfActions(path), expected)
+
+    def test_mazes_with_many_goals_match_ucs(self):
+        rng = random.Random(0)
+        for layoutName in ['tinyMaze', 'mediumMaze']:
+            gameState = loadGameState(layoutName)
+            cells = gameState.getWalls().asList(False)
+            for costFn in self.COSTS:
+                starts, goals = rng.sample(cells, 3), rng.sample(cells, 4)
+                goals = [cell for cell in goals if cell not in starts]
+                path, start, goal = search.multiGoalSearch(
+                    MultiGoalPositionProblem(gameState, goals, costFn), starts, goals)
+                self.assertTrue(start in starts and goal in goals)
+                costs = []
+                for candidate in starts:
+                    problem = MultiGoalPositionProblem(gameState, goals, costFn, start=candidate)
+                    costs.append(problem.getCostOfActions(search.ucs(problem)))
+                found = MultiGoalPositionProblem(gameState, [goal], costFn, start=start)
+                self.assertAlmostEqual(found.getCostOfActions(path), min(costs))
+
+
+class TestPredecessors(unittest.TestCase):
+
+    def test_inverse_of_successors(self):
+        for layoutName in ['tinyMaze', 'smallMaze']:
+            gameState = loadGameState(layoutName)
+            for costFn in [lambda pos: 1, lambda pos: 1 + (pos[0] * 7 + pos[1] * 3) % 5]:
+                problem = searchAgents.PositionSearchProblem(gameState, costFn, warn=False, visualize=False)
+                forward, backward = set(), set()
+                for cell in gameState.getWalls().asList(False):
+                    for successor, action, cost in problem.getSuccessors(cell):
+                        forward.add((cell, action, successor, cost))
+                    for predecessor, action, cost in problem.getPredecessors(cell):
+                        backward.add((predecessor, action, cell, cost))
+                self.assertTrue(forward)
+                self.assertEqual(forward, backward)
+
+    def test_goal_states(self):
+        gameState = loadGameState('tinyMaze')
+        problem = searchAgents.PositionSearchProblem(gameState, warn=False, visualize=False)
+        self.assertEqual(problem.getGoalStates(), [(1, 1)])
+        problem = searchAgents.AnyFoodSearchProblem(gameState)
+        self.assertEqual(problem.getGoalStates(), gameState.getFood().asList())
+        for goal in problem.getGoalStates():
+            self.assertTrue(problem.isGoalState(goal))
+
+# Two corridors that are not connected to each other
+SPLIT_LAYOUT = [
+    '%%%%%%%%',
+    '%P  %  %',
+    '%%%%%%%%',
+]
+
+class TestMazeDistanceOracle(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertMatchesBFS(self, oracle, gameState):
+        cells = gameState.getWalls().asList(False)
+        for start in cells:
+            for goal in cells:
+                problem = searchAgents.PositionSearchProblem(gameState, goal=goal, start=start,
+                                                             warn=False, visualize=False)
+                path = search.bfs(problem)
+                expected = len(path) if path or start == goal else float('inf')
+                self.assertEqual(oracle.getDistance(start, goal), expected)
+
+    def test_cache_round_trip(self):
+        for layoutName in ['tinyMaze', 'smallMaze']:
+            lay = layout.getLayout(layoutName)
+            gameState = loadGameState(layoutName)
+            key = '\n'.join(lay.layoutText)
+            written = searchAgents.MazeDistanceOracle(lay.walls, key, self.directory)
+            self.assertFalse(hasattr(written, '_mmap'))
+            loaded = searchAgents.MazeDistanceOracle(lay.walls, key, self.directory)
+            self.assertTrue(hasattr(loaded, '_mmap'))
+            self.assertEqual(list(loaded.distances), list(written.distances))
+            self.assertMatchesBFS(loaded, gameState)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+    def test_unreachable_cells(self):
+        lay = layout.Layout(SPLIT_LAYOUT)
+        gameState = GameState()
+        gameState.initialize(lay, 0)
+        oracle = searchAgents.MazeDistanceOracle(lay.walls)
+        self.assertEqual(oracle.getDistance((1, 1), (3, 1)), 2)
+        self.assertEqual(oracle.getDistance((1, 1), (5, 1)), float('inf'))
+        self.assertEqual(searchAgents.mazeDistance((1, 1), (6, 1), gameState), float('inf'))
+        self.assertMatchesBFS(oracle, gameState)
+
+    def test_for_layout_persists_when_given_a_cache_dir(self):
+        lay = layout.getLayout('tinyMaze')
+        inMemory = searchAgents.MazeDistanceOracle.forLayout(lay)
+        self.assertTrue(searchAgents.MazeDistanceOracle.forLayout(lay) is inMemory)
+        cached = searchAgents.MazeDistanceOracle.forLayout(lay, self.directory)
+        self.assertFalse(cached is inMemory)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertEqual(list(cached.distances), list(inMemory.distances))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -29,6 +29,7 @@
 import sys
 import inspect
 import heapq, random
+from array import array
 try:
     from StringIO import StringIO ## for Python 2
 except ImportError:
@@ -225,6 +226,217 @@ class PriorityQueueWithFunction(PriorityQueue):
         "Adds an item to the queue with priority from the priority function"
         PriorityQueue.push(self, item, self.priorityFunction(item))
 
+class IndexedPriorityQueue:
+    """
+      Implements a binary min-heap that also keeps a map from each item's
+      key to its position in the heap.  This makes membership tests O(1) and
+      lets the priority of a queued item be lowered in O(log n) without the
+      linear scan and heapify that PriorityQueue.update needs.
+
+      Items are keyed by keyFunction(item) (the item itself by default), so
+      for search nodes like (state, path) pass keyFunction=lambda n: n[0].
+      Ties between equal priorities are broken in insertion order, exactly
+      as in PriorityQueue.  Removed items are deleted lazily: they stay in the
+      heap, flagged, until they reach the top.
+    """
+    def  __init__(self, keyFunction=None):
+        self.keyFunction = keyFunction
+        self.heap = []          # entries are [priority, count, key, item]
+        self.position = {}      # key -> index of its live entry in self.heap
+        self.count = 0
+        self.size = 0
+
+    def _key(self, item):
+        if self.keyFunction is None: return item
+        return self.keyFunction(item)
+
+    def push(self, item, priority):
+        "Adds an item; if its key is already queued this behaves like update"
+        key = self._key(item)
+        if key in self.position:
+            self.decreaseKey(key, item, priority)
+            return
+        entry = [priority, self.count, key, item]
+        self.count += 1
+        self.heap.append(entry)
+        self.position[key] = len(self.heap) - 1
+        self.size += 1
+        self._siftUp(len(self.heap) - 1)
+
+    def pop(self):
+        "Removes and returns the item with the lowest priority"
+        while self.heap:
+            entry = self._popEntry()
+            if entry[2] is not _REMOVED:
+                del self.position[entry[2]]
+                self.size -= 1
+                return entry[3]
+        raise IndexError('pop from an empty priority queue')
+
+    def isEmpty(self):
+        return self.size == 0
+
+    def __len__(self):
+        return self.size
+
+    def peekPriority(self):
+        "Returns the lowest priority in the queue without removing its item"
+        while self.heap[0][2] is _REMOVED:
+            self._popEntry()
+        return self.heap[0][0]
+
+    def contains(self, key):
+        "Returns true if an item with this key is still queued"
+        return key in self.position
+
+    __contains__ = contains
+
+    def getPriority(self, key):
+        return self.heap[self.position[key]][0]
+
+    def item(self, key):
+        "Returns the queued item with this key"
+        return self.heap[self.position[key]][3]
+
+    def decreaseKey(self, key, item, priority):
+        """
+          Replaces the queued item for key when the new priority is no worse
+          than the stored one, moving it up the heap if the priority dropped.
+          The entry keeps its original insertion count so tie-breaking is
+          unchanged.  Returns True if the item was replaced.
+        """
+        index = self.position[key]
+        entry = self.heap[index]
+        if priority > entry[0]:
+            return False
+        entry[3] = item
+        if priority < entry[0]:
+            entry[0] = priority
+            self._siftUp(index)
+        return True
+
+    def update(self, item, priority):
+        # Same contract as PriorityQueue.update: lower the priority of a
+        # queued item, or push it if it is not queued yet.
+        key = self._key(item)
+        if key not in self.position:
+            self.push(item, priority)
+        elif priority < self.getPriority(key):
+            self.decreaseKey(key, item, priority)
+
+    def remove(self, key):
+        "Lazily deletes the item with this key; it is dropped when it surfaces"
+        entry = self.heap[self.position.pop(key)]
+        entry[2] = _REMOVED
+        self.size -= 1
+
+    def _less(self, i, j):
+        a, b = self.heap[i], self.heap[j]
+        return a[0] < b[0] or (a[0] == b[0] and a[1] < b[1])
+
+    def _swap(self, i, j):
+        heap = self.heap
+        heap[i], heap[j] = heap[j], heap[i]
+        if heap[i][2] is not _REMOVED: self.position[heap[i][2]] = i
+        if heap[j][2] is not _REMOVED: self.position[heap[j][2]] = j
+
+    def _siftUp(self, i):
+        while i > 0:
+            parent = (i - 1) >> 1
+            if not self._less(i, parent): break
+            self._swap(i, parent)
+            i = parent
+
+    def _siftDown(self, i):
+        n = len(self.heap)
+        while True:
+            smallest = i
+            left, right = 2 * i + 1, 2 * i + 2
+            if left < n and self._less(left, smallest): smallest = left
+            if right < n and self._less(right, smallest): smallest = right
+            if smallest == i: break
+            self._swap(i, smallest)
+            i = smallest
+
+    def _popEntry(self):
+        heap = self.heap
+        last = heap.pop()
+        if not heap:
+            return last
+        top = heap[0]
+        heap[0] = last
+        if last[2] is not _REMOVED: self.position[last[2]] = 0
+        self._siftDown(0)
+        return top
+
+# Marker stored in place of the key of a lazily removed IndexedPriorityQueue entry
+_REMOVED = object()
+
+
+class SearchNodeTable:
+    """
+      A compact store of search nodes shared by the search functions.  Each
+      node is an integer id indexing parallel arrays that hold its state, its
+      parent's id, the code of the action that reached it and its path cost,
+      so a frontier only has to hold ints instead of a copy of the path.
+      The list of actions is built only when getPath is called on a goal.
+    """
+    ROOT = -1
+
+    def __init__(self):
+        self.states = []
+        self.parents = array('l')
+        self.actionCodes = array('l')
+        self.costs = array('d')
+        self.actionNames = []   # action code -> action
+        self._codes = {}        # action -> action code
+
+    def __len__(self):
+        return len(self.states)
+
+    def _actionCode(self, action):
+        code = self._codes.get(action)
+        if code is None:
+            code = self._codes[action] = len(self.actionNames)
+            self.actionNames.append(action)
+        return code
+
+    def add(self, state, parent=ROOT, action=None, cost=0):
+        "Stores a new node and returns its id"
+        self.states.append(state)
+        self.parents.append(parent)
+        self.actionCodes.append(-1 if parent == self.ROOT else self._actionCode(action))
+        self.costs.append(cost)
+        return len(self.states) - 1
+
+    def reparent(self, node, parent, action, cost):
+        "Points a node that has not been expanded yet at a cheaper parent"
+        self.parents[node] = parent
+        self.actionCodes[node] = self._actionCode(action)
+        self.costs[node] = cost
+
+    def getState(self, node):
+        return self.states[node]
+
+    def getCost(self, node):
+        return self.costs[node]
+
+    def getRoot(self, node):
+        "Returns the id of the root node that node descends from"
+        parents = self.parents
+        while parents[node] != self.ROOT:
+            node = parents[node]
+        return node
+
+    def getPath(self, node):
+        "Returns the list of actions leading from the root to node"
+        path = []
+        parents, codes, names = self.parents, self.actionCodes, self.actionNames
+        while parents[node] != self.ROOT:
+            path.append(names[codes[node]])
+            node = parents[node]
+        path.reverse()
+        return path
 
 def manhattanDistance( xy1, xy2 ):
     "Returns the Manhattan distance between points xy1 and xy2"
@@ -594,6 +806,93 @@ def lookup(name, namespace):
         if len(options) > 1: raise Exception('Name conflict for %s' % name)
         raise Exception('%s not found as a method or class' % name)
 
+class TranspositionTable:
+    """
+      A bounded cache of search results keyed by (hash(state), depth,
+      agentIndex), where depth is the search depth remaining below the state.
+      Because the key holds the remaining depth rather than the distance from
+      the root, entries stay valid from one move to the next.  Only the hash
+      of the state is kept, so the table does not keep states alive; game
+      states have 64 bit hashes, which makes collisions vanishingly rare.
+
+      Two replacement policies are available once the table is full:
+
+        'lru'    evicts the least recently used entry.
+        'depth'  hashes each key to one of size slots and keeps whichever
+                 entry searched deeper, since it saved the most work.
+
+      hits, misses, stores and evictions are counted so the size can be tuned.
+    """
+    def __init__(self, size=100000, replacement='lru'):
+        if size < 1: raise ValueError('A transposition table needs at least one entry')
+        if replacement not in ('lru', 'depth'):
+            raise ValueError('Unknown replacement policy: %s' % replacement)
+        self.size = size
+        self.replacement = replacement
+        self.clear()
+
+    def clear(self):
+        "Removes every entry and resets the counters"
+        from collections import OrderedDict
+        self.entries = OrderedDict() if self.replacement == 'lru' else {}
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def lookup(self, state, depth, agentIndex):
+        """
+          Returns the value stored for the state, or None if there is none.
+        """
+        key = (hash(state), depth, agentIndex)
+        if self.replacement == 'lru':
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+        else:
+            entry = self.entries.get(hash(key) % self.size)
+            if entry is None or entry[0] != key:
+                self.misses += 1
+                return None
+            value = entry[1]
+        self.hits += 1
+        return value
+
+    def store(self, state, depth, agentIndex, value):
+        """
+          Records the value of the state, evicting an entry if the table is full.
+        """
+        key = (hash(state), depth, agentIndex)
+        self.stores += 1
+        if self.replacement == 'lru':
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            slot = hash(key) % self.size
+            entry = self.entries.get(slot)
+            if entry is not None and entry[0] != key:
+                if entry[0][1] > depth: return
+                self.evictions += 1
+            self.entries[slot] = (key, value)
+
+    def hitRate(self):
+        "Returns the fraction of lookups that found an entry"
+        lookups = self.hits + self.misses
+        if lookups == 0: return 0.0
+        return self.hits / float(lookups)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __str__(self):
+        return ('%d/%d entries, %d hits, %d misses (%.1f%% hit rate), %d evictions'
+                % (len(self), self.size, self.hits, self.misses, 100 * self.hitRate(), self.evictions))
+
 def pause():
     """
     Pauses the output stream awaiting user feedback.
@@ -611,13 +910,58 @@ def pause():
 # this have all student code so wrapped.
 #
 import signal
+import threading
 import time
 class TimeoutFunctionException(Exception):
     """Exception to raise on a timeout"""
     pass
 
 
+# The MoveBudget of the timed call running in each thread
+_moveBudgets = threading.local()
+
+class MoveBudget:
+    """
+    The time left for one timed call into an agent, on a monotonic clock.
+    TimeoutFunction makes one for each call; agents can find it with
+    getMoveBudget() and plan their search around it.
+    """
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.deadline = time.perf_counter() + seconds
+
+    def timeLeft(self):
+        return self.deadline - time.perf_counter()
+
+    def expired(self):
+        return time.perf_counter() >= self.deadline
+
+def getMoveBudget():
+    """
+    Returns the MoveBudget of the timed call running in this thread, or None.
+    """
+    return getattr(_moveBudgets, 'budget', None)
+
+def checkTime():
+    """
+    Raises TimeoutFunctionException if the timed call running in this thread
+    is out of time.  Long computations outside the main thread should call
+    this now and then, since nothing can interrupt them there.
+    """
+    budget = getattr(_moveBudgets, 'budget', None)
+    if budget is not None and time.perf_counter() >= budget.deadline:
+        raise TimeoutFunctionException()
+
+
 class TimeoutFunction:
+    """
+    Wraps function so that calls to it take at most timeout seconds, which
+    need not be whole.  In the main thread an interval timer (SIGALRM)
+    interrupts calls that run over.  Other threads cannot take signals, so
+    there the budget is enforced through checkTime() and checked again when
+    the call returns.  Timed calls can nest; the inner one never gets more
+    time than the outer one has left.
+    """
     def __init__(self, function, timeout):
         self.timeout = timeout
         self.function = function
@@ -626,23 +970,26 @@ class TimeoutFunction:
         raise TimeoutFunctionException()
 
     def __call__(self, *args, **keyArgs):
-        # If we have SIGALRM signal, use it to cause an exception if and
-        # when this function runs too long.  Otherwise check the time taken
-        # after the method has returned, and throw an exception then.
-        if hasattr(signal, 'SIGALRM'):
+        outer = getMoveBudget()
+        budget = MoveBudget(self.timeout)
+        if outer is not None and outer.deadline < budget.deadline:
+            budget.deadline = outer.deadline
+        interrupt = hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+        if interrupt:
             old = signal.signal(signal.SIGALRM, self.handle_timeout)
-            signal.alarm(self.timeout)
-            try:
-                result = self.function(*args, **keyArgs)
-            finally:
-                signal.signal(signal.SIGALRM, old)
-            signal.alarm(0)
-        else:
-            startTime = time.time()
+            signal.setitimer(signal.ITIMER_REAL, max(budget.timeLeft(), 1e-6))
+        _moveBudgets.budget = budget
+        try:
             result = self.function(*args, **keyArgs)
-            timeElapsed = time.time() - startTime
-            if timeElapsed >= self.timeout:
-                self.handle_timeout(None, None)
+        finally:
+            _moveBudgets.budget = outer
+            if interrupt:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, old)
+                if outer is not None:
+                    signal.setitimer(signal.ITIMER_REAL, max(outer.timeLeft(), 1e-6))
+        if budget.expired():
+            raise TimeoutFunctionException()
         return result
 
 